@@ -4,33 +4,33 @@ import os
 import time
 import ctypes
 import json
+import multiprocessing
 import urllib.request
 import numpy as np
 import platform
-import cv2
 from datetime import datetime
-from threading import Thread
+from collections import OrderedDict
+from threading import Thread, Event
 
-# --- PDF GENERATION ---
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.colors import HexColor, white
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as PlatImage
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+# Frozen builds start worker processes by re-running this script; they branch off here, before Qt is imported
+if __name__ == "__main__": multiprocessing.freeze_support()
 
 # --- AI & IMAGE PROCESSING ---
-import tensorflow as tf
-from PIL import Image, ImageOps, ExifTags
+# The scan backend lives in engine.py and never imports Qt, so it also runs headless via tensorcrete.py
+from engine import (APP_VERSION, BATCH_SIZE, CACHE_OVERLAY_SIZE, APPDATA_DIR, HISTORY_PAGE_SIZE, NEAR_DUP_MAX_DISTANCE,
+                    CASCADE_MIN_SPAN, TRACES_DIR, SHARD_WORKERS, DecodedImage, ReportGenerator, AI_Engine, ScanPipeline, ShardedScan, MissionLog,
+                    FolderWatcher, discover_images, downscale, spawn_from_engine)
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QDialog,
                                QHBoxLayout, QPushButton, QLabel, QFrame,
-                               QScrollArea, QStackedWidget, QMessageBox,
+                               QStackedWidget, QMessageBox,
                                QSlider, QFileDialog, QGraphicsDropShadowEffect,
                                QSizePolicy, QComboBox, QProgressBar,
-                               QCheckBox, QListWidget, QListWidgetItem, QAbstractItemView)
+                               QCheckBox, QListWidget, QListWidgetItem, QAbstractItemView,
+                               QListView, QStyledItemDelegate, QStyle)
 from PySide6.QtCore import (Qt, QTimer, QPoint, QPropertyAnimation, QEasingCurve,
-                            QRectF, QSize, QParallelAnimationGroup, QUrl, QThread, Signal)
+                            QRectF, QSize, QParallelAnimationGroup, QUrl, QThread, Signal,
+                            QAbstractListModel, QModelIndex)
 from PySide6.QtGui import (QColor, QPainter, QFont, QPen, QPixmap, QDesktopServices, QImage)
 
 import qtawesome as qta
@@ -38,26 +38,9 @@ import qtawesome as qta
 # =============================================================================
 #  GLOBAL CONFIGURATION & PATHS
 # =============================================================================
-APP_NAME = "TensorCrete"
-APP_VERSION = "5.3 Ultimate"
-MODEL_NAME = "crack_detection_model.h5"
 UPDATE_JSON_URL = "https://raw.githubusercontent.com/MustafijRatul/tensorcrete/main/version.json"
-
-# --- LOCAL STORAGE SETUP (JSON) ---
-APPDATA_DIR = os.path.join(os.environ.get('APPDATA', ''), 'RatulApps', 'TensorCrete')
-if not os.path.exists(APPDATA_DIR):
-    os.makedirs(APPDATA_DIR)
-
 SETTINGS_FILE = os.path.join(APPDATA_DIR, 'settings.json')
-HISTORY_FILE = os.path.join(APPDATA_DIR, 'history.json')
-
-
-def resource_path(relative_path):
-    try:
-        base_path = sys._MEIPASS
-    except:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base_path, relative_path)
+THUMBNAIL_CACHE_ITEMS = 64
 
 
 # =============================================================================
@@ -137,6 +120,7 @@ class ThemeManager:
             p, s = ThemeManager.COLOR_PRESETS[color_name]
             ThemeManager.ACCENT_PRIMARY = p
             ThemeManager.ACCENT_SECONDARY = s
+            ReportGenerator.ACCENT = p
 
     @staticmethod
     def get(key):
@@ -147,6 +131,15 @@ class ThemeManager:
             return val.format(ThemeManager.OPACITY)
         return val
 
+    @staticmethod
+    def qcolor(key):
+        # QColor can't parse CSS rgba(); alpha here is 0-255, or a 0-1 fraction for the border tones
+        val = ThemeManager.get(key)
+        if val.startswith("rgba("):
+            r, g, b, a = [float(x) for x in val[5:-1].split(",")]
+            return QColor(int(r), int(g), int(b), int(a * 255) if a <= 1 else int(a))
+        return QColor(val)
+
 
 # =============================================================================
 #  WINDOW EFFECT
@@ -241,136 +234,13 @@ class UpdateDialog(QDialog):
 
 
 # =============================================================================
-#  VISION PROCESSOR
-# =============================================================================
-class VisionProcessor:
-    @staticmethod
-    def get_exif_gps(image_path):
-        try:
-            img = Image.open(image_path)
-            exif = {ExifTags.TAGS[k]: v for k, v in img._getexif().items() if
-                    k in ExifTags.TAGS} if img._getexif() else None
-            if exif: return "34.05° N, 118.24° W"
-        except:
-            pass
-        return "N/A"
-
-    @staticmethod
-    def process_xray(image_path):
-        try:
-            stream = open(image_path, "rb")
-            bytes = bytearray(stream.read())
-            numpyarray = np.asarray(bytes, dtype=np.uint8)
-            img = cv2.imdecode(numpyarray, cv2.IMREAD_COLOR)
-        except:
-            return None, "N/A"
-        if img is None: return None, "N/A"
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        kernel = np.ones((3, 3), np.uint8)
-        dilated = cv2.dilate(edges, kernel, iterations=1)
-
-        contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        max_px = 0
-        for cnt in contours:
-            x, y, w, h = cv2.boundingRect(cnt)
-            current_width = min(w, h)
-            if current_width > max_px: max_px = current_width
-
-        severity = "Micro"
-        if max_px > 10: severity = "Hairline"
-        if max_px > 30: severity = "Moderate"
-        if max_px > 80: severity = "Severe"
-        width_str = f"{max_px}px ({severity})"
-
-        heatmap = cv2.applyColorMap(dilated, cv2.COLORMAP_JET)
-        mask = dilated > 0
-        result = img.copy()
-        result[mask] = cv2.addWeighted(img[mask], 0.2, heatmap[mask], 0.8, 0)
-        h, w, ch = result.shape
-        bytesPerLine = 3 * w
-        qImg = QImage(result.data, w, h, bytesPerLine, QImage.Format_BGR888)
-        return QPixmap.fromImage(qImg), width_str
-
-
-# =============================================================================
-#  PDF GENERATOR
+#  CUSTOM WIDGETS
 # =============================================================================
-class ReportGenerator:
-    @staticmethod
-    def create_single_report(filepath, image_path, analysis_data):
-        doc = SimpleDocTemplate(filepath, pagesize=A4)
-        elements = []
-        styles = getSampleStyleSheet()
-        header_style = ParagraphStyle('Header', parent=styles['Heading1'],
-                                      textColor=HexColor(ThemeManager.ACCENT_PRIMARY), alignment=1)
-        elements.append(Paragraph(f"{APP_NAME} Inspection Report", header_style))
-        elements.append(Spacer(1, 12))
-        elements.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
-        elements.append(Spacer(1, 24))
-        im = PlatImage(image_path)
-        im.drawHeight = 3 * inch
-        im.drawWidth = 5 * inch
-        data = [
-            ["Analysis Parameter", "Value"],
-            ["File Name", os.path.basename(image_path)],
-            ["Detection Result", analysis_data['result']],
-            ["Confidence Score", f"{int(analysis_data['confidence'] * 100)}%"],
-            ["Structural Condition", analysis_data['width']],
-            ["Geo-Location", analysis_data['gps']],
-            ["AI Model", f"{APP_NAME} Core v5"]
-        ]
-        t = Table(data, colWidths=[2.5 * inch, 4 * inch])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (1, 0), HexColor(ThemeManager.ACCENT_PRIMARY)),
-            ('TEXTCOLOR', (0, 0), (1, 0), white),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), HexColor('#f5f5f5')),
-            ('GRID', (0, 0), (-1, -1), 1, white)
-        ]))
-        elements.append(im)
-        elements.append(Spacer(1, 24))
-        elements.append(t)
-        doc.build(elements)
-
-    @staticmethod
-    def create_batch_report(filepath, batch_data):
-        doc = SimpleDocTemplate(filepath, pagesize=A4)
-        elements = []
-        styles = getSampleStyleSheet()
-        elements.append(Paragraph(f"{APP_NAME} Batch Survey Report", styles['Title']))
-        elements.append(Paragraph(f"Total Scanned: {len(batch_data)} | Date: {datetime.now().strftime('%Y-%m-%d')}",
-                                  styles['Normal']))
-        elements.append(Spacer(1, 24))
-        table_data = [["ID", "Filename", "Result", "Confidence", "Condition"]]
-        cracks = 0
-        for i, item in enumerate(batch_data):
-            if item['result'] == "CRACK": cracks += 1
-            row = [str(i + 1), item['filename'], item['result'], f"{int(item['confidence'] * 100)}%", item['width']]
-            table_data.append(row)
-        t = Table(table_data)
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), HexColor(ThemeManager.ACCENT_PRIMARY)),
-            ('TEXTCOLOR', (0, 0), (-1, 0), white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [HexColor('#f9f9f9'), white]),
-            ('GRID', (0, 0), (-1, -1), 0.5, HexColor('#e0e0e0'))
-        ]))
-        elements.append(
-            Paragraph(f"Summary: {cracks} Cracks Detected / {len(batch_data) - cracks} Safe", styles['Heading2']))
-        elements.append(Spacer(1, 12))
-        elements.append(t)
-        doc.build(elements)
+def rgb_to_qimage(pixels):
+    h, w = pixels.shape[:2]
+    return QImage(pixels.data, w, h, pixels.strides[0], QImage.Format_RGB888).copy()
 
 
-# =============================================================================
-#  CUSTOM WIDGETS
-# =============================================================================
 class SlidingStackedWidget(QStackedWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -482,6 +352,27 @@ class ModernToggle(QFrame):
         self.btn_right.setStyleSheet(active if self.btn_right.isChecked() else inactive)
 
 
+class ThumbnailService:
+    # LRU of label-sized pixmaps keyed by (source key, label size), so X-ray toggles and re-clicks never rescale a
+    # full-resolution frame. Loaders receive the target (w, h) and return an RGB array or QImage close to it.
+    def __init__(self, max_items=THUMBNAIL_CACHE_ITEMS):
+        self.max_items = max_items
+        self.pixmaps = OrderedDict()
+
+    def pixmap(self, key, size, loader):
+        cache_key = (key, size.width(), size.height())
+        pix = self.pixmaps.get(cache_key)
+        if pix is not None:
+            self.pixmaps.move_to_end(cache_key)
+            return pix
+        image = loader((size.width(), size.height()))
+        if isinstance(image, np.ndarray): image = rgb_to_qimage(image)
+        pix = QPixmap.fromImage(image).scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.pixmaps[cache_key] = pix
+        while len(self.pixmaps) > self.max_items: self.pixmaps.popitem(last=False)
+        return pix
+
+
 class StunningCircularProgress(QWidget):
     def __init__(self, parent=None, size_override=None):
         super().__init__(parent)
@@ -558,6 +449,85 @@ class ProSwitch(QCheckBox):
             f"QCheckBox {{ background: transparent; }} QCheckBox::indicator {{ width: 44px; height: 24px; border-radius: 12px; border: 2px solid {ThemeManager.get('BORDER_SUBTLE')}; }} QCheckBox::indicator:unchecked {{ background-color: {ThemeManager.get('BG_INPUT')}; }} QCheckBox::indicator:checked {{ background-color: {ThemeManager.ACCENT_PRIMARY}; border-color: {ThemeManager.ACCENT_PRIMARY}; }}")
 
 
+class HistoryListModel(QAbstractListModel):
+    # Lazily pages the scan log out of HistoryStore; the view pulls more rows only as it scrolls
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.rows = []
+        self.exhausted = False
+
+    def reload(self):
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid(): return
+        before = self.rows[-1]["id"] if self.rows else None
+        page = self.store.page(HISTORY_PAGE_SIZE, before_id=before)
+        if len(page) < HISTORY_PAGE_SIZE: self.exhausted = True
+        if not page: return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows): return None
+        entry = self.rows[index.row()]
+        if role == Qt.DisplayRole: return entry['file']
+        if role == Qt.UserRole: return entry
+        return None
+
+
+class HistoryCardDelegate(QStyledItemDelegate):
+    # Paints each log entry as a ProCard-style row instead of building a widget tree per entry
+    ROW_HEIGHT = 70
+    SPACING = 8
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT + self.SPACING)
+
+    def paint(self, painter, option, index):
+        entry = index.data(Qt.UserRole)
+        if not entry: return
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        card = QRectF(option.rect.adjusted(1, 0, -1, -self.SPACING))
+        hover = option.state & QStyle.State_MouseOver
+        painter.setPen(QPen(QColor(ThemeManager.ACCENT_PRIMARY) if hover else ThemeManager.qcolor('BORDER_SUBTLE'), 1))
+        painter.setBrush(ThemeManager.qcolor('BG_CARD'))
+        painter.drawRoundedRect(card, 16, 16)
+
+        text_rect = card.adjusted(20, 0, -20, 0)
+        painter.setFont(QFont("Segoe UI", 10))
+        painter.setPen(QColor(ThemeManager.get('TEXT_MUTED')))
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, entry['time'])
+        bold = QFont("Segoe UI", 10, QFont.Bold)
+        painter.setFont(bold)
+        painter.setPen(QColor(ThemeManager.get('TEXT_HEADER')))
+        painter.drawText(text_rect.adjusted(90, 0, -130, 0), Qt.AlignVCenter | Qt.AlignLeft,
+                         painter.fontMetrics().elidedText(entry['file'], Qt.ElideMiddle, int(text_rect.width()) - 220))
+
+        col = QColor(ThemeManager.ACCENT_DANGER if entry['result'] == "CRACK" else
+                     ThemeManager.get('TEXT_MUTED') if entry['result'] == "SCREENED" else ThemeManager.ACCENT_SUCCESS)
+        painter.setFont(QFont("Segoe UI", 10, QFont.ExtraBold))
+        pill_w = painter.fontMetrics().horizontalAdvance(entry['result']) + 24
+        pill = QRectF(text_rect.right() - pill_w, card.center().y() - 15, pill_w, 30)
+        painter.setPen(QPen(col, 1))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRoundedRect(pill, 5, 5)
+        painter.drawText(pill, Qt.AlignCenter, entry['result'])
+        painter.restore()
+
+
 class ToastNotification(QFrame):
     def __init__(self, parent):
         super().__init__(parent)
@@ -698,70 +668,157 @@ class ModernAboutDialog(QDialog):
         f.setGraphicsEffect(QGraphicsDropShadowEffect(blurRadius=50, color=QColor(0, 0, 0, 200)))
 
 
-# =============================================================================
-#  BACKEND LOGIC
-# =============================================================================
-class AI_Engine:
-    def __init__(self):
-        self.model = None
-        self.history = []
-        self.load_history()
-
-    def load_model(self):
-        # USE resource_path() HERE TO FIND THE BUNDLED FILE
-        model_path = resource_path(MODEL_NAME)
+class ModelLoader(QThread):
+    model_ready = Signal(bool, str)
 
-        # Debug print (optional, helps see where it is looking)
-        print(f"Looking for model at: {model_path}")
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
 
-        if os.path.exists(model_path):
+    def run(self):
+        success, msg = self.engine.load_model()
+        if success:
             try:
-                self.model = tf.keras.models.load_model(model_path)
-                return True, "Model Loaded Successfully"
+                self.engine.warm_up()
             except Exception as e:
-                return False, str(e)
-        return False, f"Model file not found at: {model_path}"
+                print(f"Model warm-up failed: {e}")
+        self.model_ready.emit(success, msg)
+        self.engine.load_history()
+
+
+class PredictWorker(QThread):
+    # Single-image analysis: a full-resolution decode, edge pass and possibly tiled inference, which can also wait
+    # on a batch scan's forward pass for the model, so it stays off the GUI thread
+    prediction_done = Signal(object, object)
+
+    def __init__(self, engine, image):
+        super().__init__()
+        self.engine = engine
+        self.image = image
+
+    def run(self):
+        result, confidence, width_str, gps, xray = self.engine.predict(self.image)
+        # Only a bounded copy of the overlay is kept; the label pixmaps come from the thumbnail cache
+        xray = downscale(xray, CACHE_OVERLAY_SIZE) if xray is not None else None
+        self.prediction_done.emit(self.image, (result, confidence, width_str, gps, xray))
+
+
+# =============================================================================
+#  BATCH SCAN WORKER
+# =============================================================================
+class BatchScanWorker(QThread):
+    item_scanned = Signal(int, dict)
+    item_restored = Signal(dict)
+    discovered = Signal(int, bool)
+    scan_failed = Signal(str)
+    scan_finished = Signal(bool)
+
+    def __init__(self, engine, folder, batch_size=BATCH_SIZE, shards=1, mission=None, done=None, watch=False):
+        super().__init__()
+        self.engine = engine
+        self.folder = folder
+        self.batch_size = batch_size
+        self.shards = shards
+        self.mission = mission
+        self.done = done or {}
+        self.watch = watch
+        self._watch_stop = Event()
+        self._cancelled = False
+        self._running = Event()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def is_paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        self._cancelled = True
+        self._watch_stop.set()
+        self._running.set()
+
+    def stop_watch(self):
+        # Ends a live watch gracefully: images already picked up still get scanned
+        self._watch_stop.set()
+
+    def _discover(self, paths):
+        # Pulled by the scan's decode stage, so the first images are analysed while the folder walk goes on.
+        # Files the checkpoint already covers are replayed to the GUI instead of being scanned again.
+        found = 0
+        reported_at = 0.0
+        for path in paths:
+            if self._cancelled: break
+            found += 1
+            now = time.monotonic()
+            if self.watch or now - reported_at > 0.2:
+                reported_at = now
+                self.discovered.emit(found, False)
+            row = self.done.get(path)
+            if row is not None:
+                self.item_restored.emit({k: row[k] for k in ("filename", "path", "result", "confidence", "width", "gps",
+                                                             "linked_to") if k in row})
+                continue
+            yield path
+        self.discovered.emit(found, True)
 
-    def load_history(self):
-        if os.path.exists(HISTORY_FILE):
+    def run(self):
+        # scan_finished always fires, even if the scan fails to start, so the GUI never stays in scanning mode
+        scan = None
+        failed = False
+        try:
+            if self.watch:
+                # Live uploads arrive far slower than one pipeline scans, so watch mode always runs in-process
+                pipeline = ScanPipeline(self.engine, self.batch_size)
+                watcher = FolderWatcher(self.folder)
+                scan = pipeline.run(self._discover(watcher.watch(pipeline.stopped, self._watch_stop)))
+            else:
+                if self.shards > 1:
+                    pipeline = ShardedScan(self.engine, self.shards, self.batch_size)
+                else:
+                    pipeline = ScanPipeline(self.engine, self.batch_size)
+                scan = pipeline.run(self._discover(discover_images(self.folder)))
+            for i, (path, res, conf, width_str, gps, preview) in enumerate(scan):
+                self._running.wait()
+                if self._cancelled: break
+                data = {"filename": os.path.basename(path), "path": path, "result": res,
+                        "confidence": float(conf), "width": width_str, "gps": gps}
+                if path in pipeline.links: data["linked_to"] = os.path.basename(pipeline.links[path])
+                # Checkpoint before the GUI sees it; failed images stay out of the log so a resume retries them
+                if self.mission and res: self.mission.append(data)
+                data["preview"] = rgb_to_qimage(preview) if preview is not None else None
+                self.item_scanned.emit(i, data)
+        except Exception as e:
+            failed = True
+            self.scan_failed.emit(str(e))
+        finally:
             try:
-                with open(HISTORY_FILE, 'r') as f:
-                    self.history = json.load(f)
+                if scan is not None: scan.close()
+                if self.mission: self.mission.close(finished=not (self._cancelled or failed))
             except:
-                self.history = []
+                pass
+            self.scan_finished.emit(self._cancelled)
 
-    def save_history(self):
-        try:
-            with open(HISTORY_FILE, 'w') as f:
-                json.dump(self.history, f, indent=4)
-        except:
-            pass
 
-    def predict(self, image_path):
-        if not self.model: return None, 0.0, 0.0, "", None
+class ReportWorker(QThread):
+    progress = Signal(int, int)
+    report_done = Signal(bool, str)
+
+    def __init__(self, filepath, batch_data):
+        super().__init__()
+        self.filepath = filepath
+        self.batch_data = list(batch_data)
+
+    def run(self):
         try:
-            image = Image.open(image_path)
-            image_resized = ImageOps.fit(image, (224, 224), Image.Resampling.LANCZOS)
-            img_array = np.array(image_resized)
-            if img_array.ndim == 2:
-                img_array = np.stack((img_array,) * 3, axis=-1)
-            else:
-                img_array = img_array[:, :, :3]
-            img_array = np.expand_dims(img_array, axis=0)
-            prediction = self.model.predict(img_array, verbose=0)
-            confidence = prediction[0][0]
-            result = "CRACK" if confidence > 0.5 else "SAFE"
-            xray_pix, width_str = VisionProcessor.process_xray(image_path)
-            gps_data = VisionProcessor.get_exif_gps(image_path)
-
-            # Append to history and Save JSON
-            self.history.insert(0, {"time": datetime.now().strftime("%H:%M:%S"), "file": os.path.basename(image_path),
-                                    "confidence": float(confidence), "result": result})
-            self.save_history()
-
-            return result, confidence, width_str, gps_data, xray_pix
-        except:
-            return None, 0.0, "Err", "", None
+            for page, pages in ReportGenerator.iter_batch_report(self.filepath, self.batch_data):
+                self.progress.emit(page, pages)
+            self.report_done.emit(True, self.filepath)
+        except Exception as e:
+            self.report_done.emit(False, str(e))
 
 
 # =============================================================================
@@ -776,19 +833,37 @@ class CrackAnalyzerApp(QMainWindow):
 
         self.engine = AI_Engine()
         self.win_effect = WindowEffect()
-        self.batch_images = []
+        self.batch_total = 0
         self.batch_data_cache = []
         self.batch_folder = ""
-        self.current_xray_pixmap = None
-        self.current_orig_pixmap = None
+        self.batch_mission = None
+        self.batch_watching = False
+        self.batch_worker = None
+        self.batch_error = None
+        self.batch_stats = {"CRACK": 0, "SAFE": 0}
+        self.batch_preview_at = 0.0
+        # The performance panel is redrawn on a timer, not per image
+        self.perf_timer = QTimer(self)
+        self.perf_timer.setInterval(1000)
+        self.perf_timer.timeout.connect(self.update_perf_panel)
+        self.thumbs = ThumbnailService()
+        self.current_xray = None
         self.current_result_data = None
         self.current_image_path = None
+        self.current_image = None
+        self.model_loader = None
+        self.predict_worker = None
+        self.predict_target = None
+        self.predict_pending = None
+        self.model_ready = False
+        self.report_worker = None
         self.first_run = True
 
         self.load_settings()
         self.apply_window_effect()
         self._init_ui()
-        QTimer.singleShot(100, self.init_ai)
+        self.init_ai()
+        self.update_scan_controls()
         QTimer.singleShot(1000, self.check_updates)
 
         # DISCORD CHECK
@@ -801,7 +876,9 @@ class CrackAnalyzerApp(QMainWindow):
         # Load from JSON
         defaults = {
             "theme": "Ambient", "accent": "Civil Red", "opacity": 230,
-            "glass": True, "btn_style": "Gradient", "first_run": True
+            "glass": True, "btn_style": "Gradient", "first_run": True, "tiled": False, "sharded": False,
+            "near_dup": False, "near_dup_distance": NEAR_DUP_MAX_DISTANCE, "cascade": False,
+            "cascade_span": CASCADE_MIN_SPAN
         }
         if os.path.exists(SETTINGS_FILE):
             try:
@@ -817,6 +894,13 @@ class CrackAnalyzerApp(QMainWindow):
         ThemeManager.GLASS_ENABLED = defaults["glass"]
         ThemeManager.BUTTON_STYLE = defaults["btn_style"]
         self.first_run = defaults["first_run"]
+        self.engine.tiled = defaults["tiled"]
+        self.sharded = defaults["sharded"]
+        self.near_dup = defaults["near_dup"]
+        self.near_dup_distance = defaults["near_dup_distance"]
+        self.cascade_span = defaults["cascade_span"]
+        self.engine.cascade = self.cascade_span if defaults["cascade"] else None
+        self.engine.near_dup = self.near_dup_distance if self.near_dup else None
 
     def save_settings(self):
         data = {
@@ -825,7 +909,13 @@ class CrackAnalyzerApp(QMainWindow):
             "opacity": ThemeManager.OPACITY,
             "glass": ThemeManager.GLASS_ENABLED,
             "btn_style": ThemeManager.BUTTON_STYLE,
-            "first_run": self.first_run
+            "first_run": self.first_run,
+            "tiled": self.engine.tiled,
+            "sharded": self.sharded,
+            "near_dup": self.near_dup,
+            "near_dup_distance": self.near_dup_distance,
+            "cascade": self.engine.cascade is not None,
+            "cascade_span": self.cascade_span
         }
         try:
             with open(SETTINGS_FILE, 'w') as f:
@@ -834,6 +924,16 @@ class CrackAnalyzerApp(QMainWindow):
             pass
 
     def closeEvent(self, event):
+        if self.report_worker and self.report_worker.isRunning():
+            self.report_worker.wait()
+        if self.model_loader and self.model_loader.isRunning():
+            self.model_loader.wait()
+        if self.predict_worker and self.predict_worker.isRunning():
+            self.predict_worker.wait()
+        if self.batch_worker and self.batch_worker.isRunning():
+            self.batch_worker.cancel()
+            self.batch_worker.wait()
+        self.engine.save_history()
         self.save_settings()
         super().closeEvent(event)
 
@@ -841,12 +941,27 @@ class CrackAnalyzerApp(QMainWindow):
         self.win_effect.set_acrylic(self.winId(), ThemeManager.GLASS_ENABLED)
 
     def init_ai(self):
-        success, msg = self.engine.load_model()
+        # TensorFlow import, model load and warm-up all happen on the loader thread
+        self.model_loader = ModelLoader(self.engine)
+        self.model_loader.model_ready.connect(self.on_model_ready)
+        self.model_loader.start()
+
+    def on_model_ready(self, success, msg):
+        self.model_ready = success
+        self.update_scan_controls()
         if success:
-            self.toaster.show_message("AI Core Online", "fa5s.brain")
+            self.toaster.show_message(f"AI Core Online ({self.engine.backend})", "fa5s.brain")
         else:
             QMessageBox.critical(self, "Error", f"Could not load model!\n{msg}")
 
+    def update_scan_controls(self):
+        loading = self.model_loader is not None and self.model_loader.isRunning() and not self.model_ready
+        scanning = self.batch_worker is not None and self.batch_worker.isRunning()
+        self.btn_scan.setText("AI Core Loading..." if loading else "Analyze Crack")
+        self.btn_scan.setEnabled(self.model_ready and self.current_image_path is not None)
+        self.btn_batch_run.setText("AI Core Loading..." if loading else "Initiate Swarm")
+        self.btn_batch_run.setEnabled(self.model_ready and bool(self.batch_folder) and not scanning)
+
     def check_updates(self):
         self.updater = UpdateWorker()
         self.updater.update_found.connect(self.show_update_dialog)
@@ -1008,14 +1123,26 @@ class CrackAnalyzerApp(QMainWindow):
         batch_ctrl = QHBoxLayout()
         self.lbl_batch_folder = QLabel("No Flight Path Selected",
                                        styleSheet=f"color:{ThemeManager.get('TEXT_MUTED')}; font-style: italic;")
-        btn_batch_sel = NeonButton("Select Folder", "secondary")
-        btn_batch_sel.clicked.connect(self.select_batch_folder)
+        self.btn_batch_sel = NeonButton("Select Folder", "secondary")
+        self.btn_batch_sel.clicked.connect(self.select_batch_folder)
         self.btn_batch_run = NeonButton("Initiate Swarm", "primary")
         self.btn_batch_run.setEnabled(False)
         self.btn_batch_run.clicked.connect(self.run_batch_scan)
+        self.btn_batch_pause = NeonButton("Pause", "secondary")
+        self.btn_batch_pause.clicked.connect(self.toggle_batch_pause)
+        self.btn_batch_pause.hide()
+        self.btn_batch_cancel = NeonButton("Abort", "secondary")
+        self.btn_batch_cancel.clicked.connect(self.cancel_batch_scan)
+        self.btn_batch_cancel.hide()
+        self.sw_batch_watch = ProSwitch()
+        self.sw_batch_watch.setToolTip("Keep scanning new images as the drone uploads them")
         batch_ctrl.addWidget(self.lbl_batch_folder, stretch=1)
-        batch_ctrl.addWidget(btn_batch_sel)
+        batch_ctrl.addWidget(self.btn_batch_sel)
+        batch_ctrl.addWidget(QLabel("Live Watch", styleSheet=f"color:{ThemeManager.get('TEXT_MUTED')};"))
+        batch_ctrl.addWidget(self.sw_batch_watch)
         batch_ctrl.addWidget(self.btn_batch_run)
+        batch_ctrl.addWidget(self.btn_batch_pause)
+        batch_ctrl.addWidget(self.btn_batch_cancel)
         bpc_lay.addLayout(batch_ctrl)
         left_batch.addWidget(self.batch_preview_card, stretch=4)
         self.batch_list = QListWidget()
@@ -1023,7 +1150,30 @@ class CrackAnalyzerApp(QMainWindow):
         self.batch_list.itemClicked.connect(self.on_batch_item_clicked)
         self.batch_list.setStyleSheet(
             f"QListWidget {{ background: {ThemeManager.get('BG_INPUT')}; border-radius: 12px; border: none; padding: 10px; color: {ThemeManager.get('TEXT_BODY')}; }} QListWidget::item {{ padding: 5px; }} QListWidget::item:selected {{ background: {ThemeManager.ACCENT_PRIMARY}; color: white; border-radius: 5px; }}")
-        left_batch.addWidget(self.batch_list, stretch=3)
+        list_row = QHBoxLayout()
+        list_row.addWidget(self.batch_list, stretch=3)
+        perf_card = ProCard()
+        pc_lay = QVBoxLayout(perf_card)
+        pc_lay.addWidget(QLabel("PERFORMANCE",
+                                styleSheet=f"color:{ThemeManager.get('TEXT_MUTED')}; font-weight:bold; background:transparent; border:none;"))
+        self.lbl_perf = QLabel("Stage timings appear here during a swarm scan",
+                               styleSheet=f"color:{ThemeManager.get('TEXT_BODY')}; font-size: 11px; background:transparent; border:none;")
+        self.lbl_perf.setWordWrap(True)
+        self.lbl_perf.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        pc_lay.addWidget(self.lbl_perf, stretch=1)
+        perf_ctrl = QHBoxLayout()
+        self.sw_trace = ProSwitch()
+        self.sw_trace.setToolTip("Write every image's stage timings to a JSON-lines trace file")
+        self.sw_trace.clicked.connect(self.on_trace_toggle)
+        perf_ctrl.addWidget(QLabel("Trace", styleSheet=f"color:{ThemeManager.get('TEXT_MUTED')}; background:transparent; border:none;"))
+        perf_ctrl.addWidget(self.sw_trace)
+        perf_ctrl.addStretch()
+        self.btn_perf_export = NeonButton("Export", "secondary")
+        self.btn_perf_export.clicked.connect(self.export_metrics)
+        perf_ctrl.addWidget(self.btn_perf_export)
+        pc_lay.addLayout(perf_ctrl)
+        list_row.addWidget(perf_card, stretch=2)
+        left_batch.addLayout(list_row, stretch=3)
         pb_lay.addLayout(left_batch, stretch=2)
         batch_stats_card = ProCard()
         bsc_lay = QVBoxLayout(batch_stats_card)
@@ -1049,6 +1199,10 @@ class CrackAnalyzerApp(QMainWindow):
         self.stat_safe_widget, self.lbl_stat_safe = make_stat("SAFE", ThemeManager.ACCENT_SUCCESS)
         bsc_lay.addWidget(self.stat_cracks_widget)
         bsc_lay.addWidget(self.stat_safe_widget)
+        self.lbl_cascade = QLabel(styleSheet=f"color: {ThemeManager.get('TEXT_MUTED')}; font-size: 11px; background: transparent;")
+        self.lbl_cascade.setWordWrap(True)
+        self.lbl_cascade.hide()
+        bsc_lay.addWidget(self.lbl_cascade)
         self.btn_batch_pdf = NeonButton("Download Mission Report", "secondary")
         self.btn_batch_pdf.setEnabled(False)
         self.btn_batch_pdf.clicked.connect(self.generate_batch_report)
@@ -1071,36 +1225,57 @@ class CrackAnalyzerApp(QMainWindow):
     # --- LOGIC ---
     def load_image(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Open Image", "",
-                                                   "Image Files (*.jpg *.png *.jpeg *.webp *.bmp *.tiff)")
+                                                   "Image Files (*.jpg *.png *.jpeg *.webp *.bmp *.tif *.tiff)")
         if file_path:
+            try:
+                image = DecodedImage(file_path)
+                pix = self.thumbs.pixmap(("image", image.digest), self.img_label.size(), image.thumbnail)
+            except:
+                self.toaster.show_message("Could not open image", "fa5s.exclamation-triangle")
+                return
             self.current_image_path = file_path
-            self.current_orig_pixmap = QPixmap(file_path)
-            self.img_label.setPixmap(
-                self.current_orig_pixmap.scaled(self.img_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            self.current_image = image
+            self.current_xray = None
+            self.img_label.setPixmap(pix)
             self.img_label.setStyleSheet("border: none;")
-            self.btn_scan.setEnabled(True)
+            self.update_scan_controls()
             self.lbl_result_text.setText("READY")
             self.chk_xray.setChecked(False)
             self.btn_pdf.setEnabled(False)
 
     def toggle_xray_view(self):
-        if not self.current_image_path: return
-        if self.chk_xray.isChecked() and self.current_xray_pixmap:
-            self.img_label.setPixmap(
-                self.current_xray_pixmap.scaled(self.img_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        elif self.current_orig_pixmap:
-            self.img_label.setPixmap(
-                self.current_orig_pixmap.scaled(self.img_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        if not self.current_image: return
+        digest = self.current_image.digest
+        if self.chk_xray.isChecked() and self.current_xray is not None:
+            self.img_label.setPixmap(self.thumbs.pixmap(("xray", digest, self.engine.result_key),
+                                                        self.img_label.size(), lambda size: self.current_xray))
+        else:
+            self.img_label.setPixmap(self.thumbs.pixmap(("image", digest), self.img_label.size(),
+                                                        self.current_image.thumbnail))
 
     def run_prediction(self):
         if not self.current_image_path: return
-        self.lbl_result_text.setText("ANALYZING...")
-        QApplication.processEvents()
-        self._execute_single_predict(self.current_image_path)
+        self._execute_single_predict(self.current_image or self.current_image_path)
 
-    def _execute_single_predict(self, path):
-        result, confidence, width_str, gps, xray = self.engine.predict(path)
-        self.current_xray_pixmap = xray
+    def _execute_single_predict(self, image):
+        # One analysis runs at a time; clicks while it runs only keep the newest image, and stale results are dropped
+        self.predict_target = image
+        self.predict_pending = image
+        self.lbl_result_text.setText("ANALYZING...")
+        if self.predict_worker is None or not self.predict_worker.isRunning(): self._start_predict()
+
+    def _start_predict(self):
+        if self.predict_pending is None: return
+        image, self.predict_pending = self.predict_pending, None
+        self.predict_worker = PredictWorker(self.engine, image)
+        self.predict_worker.prediction_done.connect(self.on_prediction_done)
+        self.predict_worker.finished.connect(self._start_predict)
+        self.predict_worker.start()
+
+    def on_prediction_done(self, image, analysis):
+        if image is not self.predict_target: return
+        result, confidence, width_str, gps, xray = analysis
+        self.current_xray = xray
         self.current_result_data = {"result": result, "confidence": confidence, "width": width_str, "gps": gps}
         if result:
             pct = int(confidence * 100)
@@ -1120,13 +1295,16 @@ class CrackAnalyzerApp(QMainWindow):
             self.lbl_gps.setText(f"GPS: {gps}")
             self.btn_pdf.setEnabled(True)
             self.toggle_xray_view()
+        else:
+            self.lbl_result_text.setText("ANALYSIS FAILED")
 
     def generate_pdf_report(self):
         if not self.current_result_data: return
         fname = f"Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         s_path, _ = QFileDialog.getSaveFileName(self, "Save Report", fname, "PDF (*.pdf)")
         if s_path:
-            ReportGenerator.create_single_report(s_path, self.current_image_path, self.current_result_data)
+            ReportGenerator.create_single_report(s_path, self.current_image_path, self.current_result_data,
+                                                 self.current_xray)
             self.toaster.show_message("Report PDF Saved", "fa5s.file-pdf")
 
     def select_batch_folder(self):
@@ -1134,11 +1312,16 @@ class CrackAnalyzerApp(QMainWindow):
         if folder:
             self.batch_folder = folder
             self.lbl_batch_folder.setText(os.path.basename(folder))
-            self.btn_batch_run.setEnabled(True)
-            self.batch_images = [f for f in os.listdir(folder) if
-                                 f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp'))]
+            self.batch_total = 0
+            self.batch_mission = MissionLog(folder)
+            self.update_scan_controls()
             self.batch_list.clear()
-            self.batch_list.addItem(f"Ready to scan {len(self.batch_images)} images...")
+            # Subfolders are walked while the swarm runs, so nothing is listed up front
+            done = self.batch_mission.completed(self.engine.scan_mode)
+            if done:
+                self.batch_list.addItem(f"Ready to resume: {len(done)} images already scanned...")
+            else:
+                self.batch_list.addItem(f"Ready to scan {os.path.basename(folder)} and its subfolders...")
             self.batch_prog_circle.set_value(0, 100)
             self.batch_prog_circle.set_text("0%", "READY")
             self.lbl_stat_cracks.setText("0")
@@ -1147,82 +1330,254 @@ class CrackAnalyzerApp(QMainWindow):
             self.batch_data_cache = []
 
     def run_batch_scan(self):
-        if not self.batch_images: return
+        if not self.batch_folder: return
+        if self.batch_worker and self.batch_worker.isRunning(): return
         self.btn_batch_run.setEnabled(False)
+        self.btn_batch_sel.setEnabled(False)
+        self.btn_batch_pdf.setEnabled(False)
         self.mode_toggle.setEnabled(False)
-        total = len(self.batch_images)
-        cracks = 0
-        safe = 0
+        self.btn_batch_pause.setText("Pause")
+        self.btn_batch_pause.show()
+        self.batch_watching = self.sw_batch_watch.isChecked()
+        self.sw_batch_watch.setEnabled(False)
+        self.btn_batch_cancel.setText("Stop Watch" if self.batch_watching else "Abort")
+        self.btn_batch_cancel.show()
         self.batch_list.clear()
         self.batch_data_cache = []
-        for i, img_name in enumerate(self.batch_images):
-            path = os.path.join(self.batch_folder, img_name)
-            pix = QPixmap(path)
+        self.batch_stats = {"CRACK": 0, "SAFE": 0}
+        self.lbl_stat_cracks.setText("0")
+        self.lbl_stat_safe.setText("0")
+        self.batch_prog_circle.set_color(None)
+        self.batch_total = 0
+        self.engine.cascade_stats.reset()
+        self.engine.metrics.reset()
+        if self.sw_trace.isChecked(): self.start_trace()
+        self.perf_timer.start()
+        self.lbl_cascade.setVisible(self.engine.cascade is not None)
+        self.lbl_cascade.setText("Cascade: waiting for frames")
+        # Pick up an interrupted mission on this folder: unchanged files keep their logged result
+        done = self.batch_mission.begin(self.engine.scan_mode)
+        if done: self.toaster.show_message(f"Resuming mission: {len(done)} images already scanned", "fa5s.redo")
+        self.batch_worker = BatchScanWorker(self.engine, self.batch_folder, BATCH_SIZE,
+                                            SHARD_WORKERS if self.sharded else 1, mission=self.batch_mission, done=done,
+                                            watch=self.batch_watching)
+        self.batch_worker.item_scanned.connect(self.on_batch_item_scanned)
+        self.batch_worker.item_restored.connect(self.on_batch_item_restored)
+        self.batch_worker.discovered.connect(self.on_batch_discovered)
+        self.batch_worker.scan_failed.connect(self.on_batch_scan_failed)
+        self.batch_worker.scan_finished.connect(self.on_batch_scan_finished)
+        self.batch_worker.start()
+
+    def toggle_batch_pause(self):
+        if not self.batch_worker: return
+        if self.batch_worker.is_paused():
+            self.batch_worker.resume()
+            self.btn_batch_pause.setText("Pause")
+            self.batch_prog_circle.set_text(self.batch_prog_circle.text, "WATCHING" if self.batch_watching else "SCANNING")
+        else:
+            self.batch_worker.pause()
+            self.btn_batch_pause.setText("Resume")
+            self.batch_prog_circle.set_text(self.batch_prog_circle.text, "PAUSED")
+
+    def cancel_batch_scan(self):
+        if not self.batch_worker: return
+        if self.batch_watching:
+            self.batch_worker.stop_watch()
+        else:
+            self.batch_worker.cancel()
+
+    def add_batch_row(self, data):
+        self.batch_data_cache.append(data)
+        res = data["result"]
+        if res == "CRACK":
+            self.batch_stats["CRACK"] += 1
+            col = ThemeManager.ACCENT_DANGER
+        elif res == "SCREENED":
+            # Screened out by the cascade: no verdict, so neither a crack nor safe
+            col = ThemeManager.get('TEXT_MUTED')
+        else:
+            self.batch_stats["SAFE"] += 1
+            col = ThemeManager.ACCENT_SUCCESS
+        linked = f" ≈ {data['linked_to']}" if data.get("linked_to") else ""
+        item = QListWidgetItem(f"[{len(self.batch_data_cache)}/{self.batch_total}] {data['filename']} : {res}{linked}")
+        item.setForeground(QColor(col))
+        item.setData(Qt.UserRole, data["path"])
+        self.batch_list.insertItem(0, item)
+
+    def update_batch_progress(self):
+        self.lbl_stat_cracks.setText(str(self.batch_stats["CRACK"]))
+        self.lbl_stat_safe.setText(str(self.batch_stats["SAFE"]))
+        pct = int((len(self.batch_data_cache) / max(1, self.batch_total)) * 100)
+        self.batch_prog_circle.set_value(pct, 100)
+        paused = self.batch_worker is not None and self.batch_worker.is_paused()
+        # While watching, the ring shows how far the scan has caught up with the uploads
+        self.batch_prog_circle.set_text(f"{pct}%", "PAUSED" if paused else "WATCHING" if self.batch_watching else "SCANNING")
+        if self.engine.cascade is not None:
+            s = self.engine.cascade_stats.summary()
+            self.lbl_cascade.setText(f"Cascade: {s['cnn_skip_rate']:.0%} skipped CNN, {s['xray_skip_rate']:.0%} skipped "
+                                     f"X-ray\nAudit: {s['missed']}/{s['audited'] + s['missed']} rejects were cracks")
+
+    def on_batch_discovered(self, found, finished):
+        self.batch_total = found
+        self.update_batch_progress()
+
+    def on_batch_item_restored(self, data):
+        self.add_batch_row(data)
+        self.update_batch_progress()
+
+    def on_batch_item_scanned(self, i, data):
+        total = self.batch_total
+        preview = data.pop("preview", None)
+        self.add_batch_row(data)
+        self.update_batch_progress()
+        # Throttle the live feed so full-res previews don't starve the event loop at high throughput
+        now = time.monotonic()
+        if preview is not None and (now - self.batch_preview_at > 0.25 or len(self.batch_data_cache) == total):
+            self.batch_preview_at = now
+            pix = QPixmap.fromImage(preview)
             self.lbl_batch_preview.setPixmap(
                 pix.scaled(self.lbl_batch_preview.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            res, conf, width_str, _, _ = self.engine.predict(path)
-            self.batch_data_cache.append(
-                {"filename": img_name, "path": path, "result": res, "confidence": conf, "width": width_str})
-            if res == "CRACK":
-                cracks += 1
-                col = ThemeManager.ACCENT_DANGER
-            else:
-                safe += 1
-                col = ThemeManager.ACCENT_SUCCESS
-            item = QListWidgetItem(f"[{i + 1}/{total}] {img_name} : {res}")
-            item.setForeground(QColor(col))
-            item.setData(Qt.UserRole, path)
-            self.batch_list.insertItem(0, item)
-            self.lbl_stat_cracks.setText(str(cracks))
-            self.lbl_stat_safe.setText(str(safe))
-            pct = int(((i + 1) / total) * 100)
-            self.batch_prog_circle.set_value(pct, 100)
-            self.batch_prog_circle.set_text(f"{pct}%", "SCANNING")
-            QApplication.processEvents()
-        self.batch_prog_circle.set_text("100%", "DONE")
-        self.batch_prog_circle.set_color(ThemeManager.ACCENT_SUCCESS)
-        self.btn_batch_run.setEnabled(True)
+
+    def on_batch_scan_failed(self, message):
+        # Arrives just before scan_finished, which reports it
+        self.batch_error = message
+
+    def on_batch_scan_finished(self, cancelled):
+        self.perf_timer.stop()
+        self.update_perf_panel()
+        self.stop_trace()
+        if self.batch_error is not None:
+            self.batch_prog_circle.set_text(self.batch_prog_circle.text, "FAILED")
+            self.batch_prog_circle.set_color(ThemeManager.ACCENT_DANGER)
+            self.toaster.show_message(f"Drone Mission Failed: {self.batch_error}", "fa5s.exclamation-triangle")
+            self.batch_error = None
+        elif cancelled:
+            self.batch_prog_circle.set_text(self.batch_prog_circle.text, "ABORTED")
+            self.batch_prog_circle.set_color(ThemeManager.ACCENT_DANGER)
+            self.toaster.show_message("Drone Mission Aborted", "fa5s.ban")
+        else:
+            self.batch_prog_circle.set_text("100%", "DONE")
+            self.batch_prog_circle.set_color(ThemeManager.ACCENT_SUCCESS)
+            self.toaster.show_message("Drone Mission Complete", "fa5s.flag-checkered")
+        self.btn_batch_pause.hide()
+        self.btn_batch_cancel.hide()
+        self.btn_batch_sel.setEnabled(True)
+        self.sw_batch_watch.setEnabled(True)
+        self.batch_watching = False
+        self.update_scan_controls()
         self.mode_toggle.setEnabled(True)
-        self.btn_batch_pdf.setEnabled(True)
-        self.toaster.show_message("Drone Mission Complete", "fa5s.flag-checkered")
+        building = self.report_worker is not None and self.report_worker.isRunning()
+        self.btn_batch_pdf.setEnabled(bool(self.batch_data_cache) and not building)
 
     def on_batch_item_clicked(self, item):
         path = item.data(Qt.UserRole)
         if path and os.path.exists(path):
-            pix = QPixmap(path)
-            self.lbl_batch_preview.setPixmap(
-                pix.scaled(self.lbl_batch_preview.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            try:
+                image = DecodedImage(path)
+                key = ("image", image.digest)
+                self.lbl_batch_preview.setPixmap(self.thumbs.pixmap(key, self.lbl_batch_preview.size(), image.thumbnail))
+                self.img_label.setPixmap(self.thumbs.pixmap(key, self.img_label.size(), image.thumbnail))
+            except:
+                return
             self.current_image_path = path
-            self.current_orig_pixmap = pix
-            self.img_label.setPixmap(pix.scaled(self.img_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            self._execute_single_predict(path)
+            self.current_image = image
+            self.current_xray = None
+            self._execute_single_predict(image)
+
+    def update_perf_panel(self):
+        snap = self.engine.metrics.snapshot()
+        stages = sorted(((name, s) for name, s in snap["stages"].items() if s["share"] is not None),
+                        key=lambda entry: -entry[1]["sum_s"])
+        muted = ThemeManager.get('TEXT_MUTED')
+        trace = self.engine.metrics.trace_path
+        trace = (f"<p style='color:{muted}'>Trace: {os.path.basename(trace)}"
+                 f"{' (recording)' if self.engine.metrics.trace else ''}</p>") if trace else ""
+        if not stages:
+            if trace: self.lbl_perf.setText(trace)
+            return
+        rows = "".join(f"<tr><td>{name}</td><td align='right'>{s['p50_ms']:.1f}</td><td align='right'>{s['p95_ms']:.1f}</td>"
+                       f"<td align='right'>{s['share']:.0%}</td></tr>" for name, s in stages)
+        html = (f"<table width='100%' cellspacing='2'><tr style='color:{muted}'><td>stage</td><td align='right'>p50 ms</td>"
+                f"<td align='right'>p95 ms</td><td align='right'>share</td></tr>{rows}</table>")
+        images = snap["images"]
+        html += f"<p style='color:{muted}'>" + ", ".join(f"{n} {kind}" for kind, n in images.items() if n) + "</p>"
+        if snap["slowest"]:
+            # The slowest images and what held each one up, to spot outliers such as huge TIFFs
+            html += f"<p style='color:{muted}'>Slowest:</p>"
+            for entry in snap["slowest"][:3]:
+                worst = max(entry["stages"].items(), key=lambda kv: kv[1])[0] if entry["stages"] else "-"
+                html += f"{os.path.basename(entry['path'])}: {entry['total_ms']:.0f} ms ({worst})<br>"
+        self.lbl_perf.setText(html + trace)
+
+    def start_trace(self):
+        os.makedirs(TRACES_DIR, exist_ok=True)
+        self.engine.metrics.start_trace(os.path.join(TRACES_DIR, f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"))
+
+    def stop_trace(self):
+        self.engine.metrics.stop_trace()
+        self.update_perf_panel()
+
+    def on_trace_toggle(self):
+        # Tracing can start or stop mid-mission; it otherwise follows the swarm scan
+        if not (self.batch_worker and self.batch_worker.isRunning()): return
+        if self.sw_trace.isChecked():
+            self.start_trace()
+        else:
+            self.stop_trace()
+
+    def export_metrics(self):
+        fname = f"ScanMetrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prom"
+        s_path, _ = QFileDialog.getSaveFileName(self, "Export Scan Metrics", fname, "Prometheus (*.prom);;JSON (*.json)")
+        if not s_path: return
+        try:
+            self.engine.metrics.export(s_path)
+            self.toaster.show_message("Metrics Exported", "fa5s.check-circle")
+        except Exception as e:
+            self.toaster.show_message(f"Export failed: {e}", "fa5s.exclamation-triangle")
 
     def generate_batch_report(self):
         if not self.batch_data_cache: return
         fname = f"MissionReport_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         s_path, _ = QFileDialog.getSaveFileName(self, "Save Batch Report", fname, "PDF (*.pdf)")
         if s_path:
-            ReportGenerator.create_batch_report(s_path, self.batch_data_cache)
+            # Large missions take a while to lay out; build the PDF on a worker and report progress on the button
+            self.btn_batch_pdf.setEnabled(False)
+            self.btn_batch_pdf.setText("Building Report...")
+            self.report_worker = ReportWorker(s_path, self.batch_data_cache)
+            self.report_worker.progress.connect(self.on_report_progress)
+            self.report_worker.report_done.connect(self.on_report_done)
+            self.report_worker.start()
+
+    def on_report_progress(self, page, pages):
+        self.btn_batch_pdf.setText(f"Building Report... {int(page / pages * 100)}%")
+
+    def on_report_done(self, success, msg):
+        self.btn_batch_pdf.setText("Download Mission Report")
+        scanning = self.batch_worker is not None and self.batch_worker.isRunning()
+        self.btn_batch_pdf.setEnabled(bool(self.batch_data_cache) and not scanning)
+        if success:
             self.toaster.show_message("Mission Report Saved", "fa5s.file-pdf")
+        else:
+            QMessageBox.critical(self, "Error", f"Could not build the mission report!\n{msg}")
 
     def _build_history(self):
         p = QWidget()
         l = QVBoxLayout(p)
         l.addWidget(QLabel("Scan Log",
                            styleSheet=f"color:{ThemeManager.get('TEXT_HEADER')}; font-size:32px; font-weight:800; background:transparent;"))
-        self.hist_scroll_widget = QWidget()
-        self.hist_layout = QVBoxLayout(self.hist_scroll_widget)
-        self.hist_layout.setAlignment(Qt.AlignTop)
-        sc = QScrollArea()
-        sc.setWidgetResizable(True)
-        sc.setStyleSheet("background: transparent; border: none;")
-        sc.setWidget(self.hist_scroll_widget)
-        l.addWidget(sc)
+        self.history_model = HistoryListModel(self.engine.history, self)
+        self.history_view = QListView()
+        self.history_view.setModel(self.history_model)
+        self.history_view.setItemDelegate(HistoryCardDelegate(self.history_view))
+        self.history_view.setUniformItemSizes(True)
+        self.history_view.setMouseTracking(True)
+        self.history_view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.history_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.history_view.setStyleSheet("QListView { background: transparent; border: none; }")
+        l.addWidget(self.history_view)
         btn = NeonButton("Refresh Log", "secondary")
         btn.clicked.connect(self.refresh_history_ui)
         l.addWidget(btn)
-        # Auto-load on build
-        QTimer.singleShot(500, self.refresh_history_ui)
         return p
 
     def _build_settings(self):
@@ -1278,6 +1633,42 @@ class CrackAnalyzerApp(QMainWindow):
         gr.addWidget(self.sw_glass)
         cl.addLayout(gr)
 
+        self.sw_tiled = ProSwitch()
+        self.sw_tiled.setChecked(self.engine.tiled)
+        self.sw_tiled.clicked.connect(self.on_tiled_toggle)
+        tlr = QHBoxLayout()
+        tlr.addWidget(QLabel("Tiled Inference (full resolution)",
+                             styleSheet=f"color:{ThemeManager.get('TEXT_HEADER')}; font-weight:bold; background:transparent;"))
+        tlr.addWidget(self.sw_tiled)
+        cl.addLayout(tlr)
+
+        self.sw_sharded = ProSwitch()
+        self.sw_sharded.setChecked(self.sharded)
+        self.sw_sharded.clicked.connect(self.on_sharded_toggle)
+        shr = QHBoxLayout()
+        shr.addWidget(QLabel(f"Multi-Process Scan ({SHARD_WORKERS} shards)",
+                             styleSheet=f"color:{ThemeManager.get('TEXT_HEADER')}; font-weight:bold; background:transparent;"))
+        shr.addWidget(self.sw_sharded)
+        cl.addLayout(shr)
+
+        self.sw_near_dup = ProSwitch()
+        self.sw_near_dup.setChecked(self.near_dup)
+        self.sw_near_dup.clicked.connect(self.on_near_dup_toggle)
+        ndr = QHBoxLayout()
+        ndr.addWidget(QLabel("Link Near-Duplicate Frames",
+                             styleSheet=f"color:{ThemeManager.get('TEXT_HEADER')}; font-weight:bold; background:transparent;"))
+        ndr.addWidget(self.sw_near_dup)
+        cl.addLayout(ndr)
+
+        self.sw_cascade = ProSwitch()
+        self.sw_cascade.setChecked(self.engine.cascade is not None)
+        self.sw_cascade.clicked.connect(self.on_cascade_toggle)
+        csr = QHBoxLayout()
+        csr.addWidget(QLabel("Cascade Pre-Filter (skip clean frames)",
+                             styleSheet=f"color:{ThemeManager.get('TEXT_HEADER')}; font-weight:bold; background:transparent;"))
+        csr.addWidget(self.sw_cascade)
+        cl.addLayout(csr)
+
         self.sl_opacity = QSlider(Qt.Horizontal)
         self.sl_opacity.setRange(50, 255)
         self.sl_opacity.setValue(ThemeManager.OPACITY)
@@ -1329,6 +1720,36 @@ class CrackAnalyzerApp(QMainWindow):
         ThemeManager.GLASS_ENABLED = self.sw_glass.isChecked()
         self.apply_window_effect()
 
+    def on_tiled_toggle(self):
+        if self.batch_worker and self.batch_worker.isRunning():
+            # A running mission keeps the mode it started with
+            self.sw_tiled.setChecked(self.engine.tiled)
+            self.toaster.show_message("Finish the swarm scan first", "fa5s.exclamation-triangle")
+            return
+        self.engine.tiled = self.sw_tiled.isChecked()
+
+    def on_sharded_toggle(self):
+        if self.batch_worker and self.batch_worker.isRunning():
+            self.sw_sharded.setChecked(self.sharded)
+            self.toaster.show_message("Finish the swarm scan first", "fa5s.exclamation-triangle")
+            return
+        self.sharded = self.sw_sharded.isChecked()
+
+    def on_near_dup_toggle(self):
+        if self.batch_worker and self.batch_worker.isRunning():
+            self.sw_near_dup.setChecked(self.near_dup)
+            self.toaster.show_message("Finish the swarm scan first", "fa5s.exclamation-triangle")
+            return
+        self.near_dup = self.sw_near_dup.isChecked()
+        self.engine.near_dup = self.near_dup_distance if self.near_dup else None
+
+    def on_cascade_toggle(self):
+        if self.batch_worker and self.batch_worker.isRunning():
+            self.sw_cascade.setChecked(self.engine.cascade is not None)
+            self.toaster.show_message("Finish the swarm scan first", "fa5s.exclamation-triangle")
+            return
+        self.engine.cascade = self.cascade_span if self.sw_cascade.isChecked() else None
+
     def on_opacity_change(self, v):
         ThemeManager.OPACITY = v
         self.apply_theme()
@@ -1340,30 +1761,14 @@ class CrackAnalyzerApp(QMainWindow):
         if pid == "history": self.refresh_history_ui()
 
     def refresh_history_ui(self):
-        while self.hist_layout.count():
-            item = self.hist_layout.takeAt(0)
-            if item.widget(): item.widget().deleteLater()
-
-        # Load from engine which loads from JSON
-        self.engine.load_history()
-
-        for entry in self.engine.history:
-            card = ProCard(fixedHeight=70)
-            cl = QHBoxLayout(card)
-            cl.addWidget(QLabel(entry['time'], styleSheet=f"color:{ThemeManager.get('TEXT_MUTED')}"))
-            cl.addWidget(
-                QLabel(entry['file'], styleSheet=f"color:{ThemeManager.get('TEXT_HEADER')}; font-weight:bold;"))
-            cl.addStretch()
-            res_lbl = QLabel(entry['result'])
-            col = ThemeManager.ACCENT_DANGER if entry['result'] == "CRACK" else ThemeManager.ACCENT_SUCCESS
-            res_lbl.setStyleSheet(
-                f"color: {col}; font-weight: 800; border: 1px solid {col}; padding: 5px 10px; border-radius: 5px;")
-            cl.addWidget(res_lbl)
-            self.hist_layout.addWidget(card)
-        self.hist_layout.addStretch()
+        self.history_model.reload()
 
 
 if __name__ == "__main__":
+    spawn_from_engine()
+    if "--export-model" in sys.argv:
+        from tensorcrete import main as cli_main
+        sys.exit(cli_main(["export"] + [a for a in sys.argv[1:] if a != "--export-model"]))
     if hasattr(Qt, 'AA_EnableHighDpiScaling'): QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     if hasattr(Qt, 'AA_UseHighDpiPixmaps'): QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
     app = QApplication(sys.argv)
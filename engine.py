@@ -0,0 +1,2302 @@
+
+import sys
+import os
+import time
+import io
+import re
+import json
+import math
+import hashlib
+import importlib.util
+import queue
+import sqlite3
+import multiprocessing
+import numpy as np
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from fnmatch import fnmatch
+from threading import Thread, Event, Lock, Semaphore
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# --- AI & IMAGE PROCESSING ---
+# Everything below is free of Qt so it can run headless (see tensorcrete.py). TensorFlow, OpenCV and ReportLab
+# are imported inside the functions that use them, so startup (and every process-pool worker, which
+# re-imports this module) doesn't pay for them.
+from PIL import Image, ImageOps
+
+# =============================================================================
+#  GLOBAL CONFIGURATION & PATHS
+# =============================================================================
+APP_NAME = "TensorCrete"
+APP_VERSION = "5.3 Ultimate"
+MODEL_NAME = "crack_detection_model.h5"
+RUNTIME_MODEL_NAME = "crack_detection_model.tflite"
+ONNX_MODEL_NAME = "crack_detection_model.onnx"
+RUNTIME_PARITY_TOLERANCE = 0.02
+RUNTIME_PARITY_SAMPLES = 32
+INFERENCE_THREADS = os.cpu_count() or 4
+MODEL_INPUT_SIZE = (224, 224)
+BATCH_SIZE = 16
+DECODE_WORKERS = 4
+XRAY_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+SHARD_WORKERS = max(1, (os.cpu_count() or 2) // 4)
+TILE_SIZE = MODEL_INPUT_SIZE[0]
+TILE_STRIDE = 168
+TILE_MIN_EDGE_FRACTION = 0.01
+PREVIEW_SIZE = 640
+CACHE_OVERLAY_SIZE = 1600
+REPORT_ROWS_PER_PAGE = 38
+REPORT_IMAGE_DPI = 150
+REPORT_JPEG_QUALITY = 80
+REPORT_THUMBS_PER_PAGE = 6
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff')
+WATCH_POLL_SECONDS = 1.0
+WATCH_SETTLE_SECONDS = 2.0
+NEAR_DUP_HASH_SIZE = 16
+NEAR_DUP_MAX_DISTANCE = 12
+CASCADE_THUMBNAIL = 512
+CASCADE_MIN_SPAN = 0.15
+CASCADE_AUDIT_EVERY = 20
+METRICS_WINDOW = 512
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_SLOWEST = 5
+METRICS_EXPORT_SECONDS = 10.0
+
+# --- LOCAL STORAGE SETUP ---
+# APPDATA only exists on Windows; headless Linux servers fall back to ~/.local/share
+APPDATA_DIR = os.path.join(os.environ.get('APPDATA') or os.path.join(os.path.expanduser('~'), '.local', 'share'),
+                           'RatulApps', 'TensorCrete')
+if not os.path.exists(APPDATA_DIR):
+    os.makedirs(APPDATA_DIR)
+
+HISTORY_FILE = os.path.join(APPDATA_DIR, 'history.db')
+LEGACY_HISTORY_FILE = os.path.join(APPDATA_DIR, 'history.json')
+RESULT_CACHE_FILE = os.path.join(APPDATA_DIR, 'result_cache.db')
+GEO_INDEX_FILE = os.path.join(APPDATA_DIR, 'geo_index.db')
+MISSIONS_DIR = os.path.join(APPDATA_DIR, 'missions')
+TRACES_DIR = os.path.join(APPDATA_DIR, 'traces')
+HISTORY_PAGE_SIZE = 200
+HISTORY_RETENTION_DAYS = 365
+HISTORY_MAX_ROWS = 500000
+
+
+def resource_path(relative_path):
+    try:
+        base_path = sys._MEIPASS
+    except:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, relative_path)
+
+
+def spawn_from_engine():
+    # Spawned X-ray and shard workers re-run the parent's __main__ as __mp_main__; under the GUI that is app.py
+    # and all of PySide6. Giving __main__ this module's spec makes them import engine.py instead. Frozen builds
+    # never re-run __main__ this way (their children stop at freeze_support()), so they are left alone.
+    if getattr(sys, "frozen", False): return
+    sys.modules["__main__"].__spec__ = importlib.util.find_spec(__name__)
+
+
+# =============================================================================
+#  VISION PROCESSOR
+# =============================================================================
+class DecodedImage:
+    # One read and one decode per image: the model tensor, X-ray, EXIF and previews are all views of this.
+    # Opening only parses the header; pixels are decoded on first use and the encoded bytes are dropped.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.digest = hashlib.blake2b(self.data, digest_size=16).hexdigest()
+        self._pil = Image.open(io.BytesIO(self.data))
+        self.size = self._pil.size
+        self.exif = self._pil.getexif()
+        self.xmp = self._pil.info.get("xmp")
+        self._pixels = None
+
+    @staticmethod
+    def of(image):
+        return image if isinstance(image, DecodedImage) else DecodedImage(image)
+
+    @property
+    def pixels(self):
+        if self._pixels is None:
+            pil = self._pil if self._pil.mode == "RGB" else self._pil.convert("RGB")
+            self._pixels = np.ascontiguousarray(pil)
+            self._pil = None
+            self.data = None
+        return self._pixels
+
+    def model_input(self):
+        image_resized = ImageOps.fit(Image.fromarray(self.pixels), MODEL_INPUT_SIZE, Image.Resampling.LANCZOS)
+        return np.asarray(image_resized)
+
+    def thumbnail(self, size):
+        # Display-size RGB array. Before the full decode, JPEGs are DCT-scaled by draft() straight from the
+        # encoded bytes, so the full-resolution frame is never built just to be shown in a label. Other formats
+        # have no reduced decode, so they go through (and keep) the one full decode.
+        w, h = size
+        if self._pil is not None and self._pil.format == "JPEG":
+            pil = Image.open(io.BytesIO(self.data))
+            pil.draft("RGB", (w, h))
+            pil = pil.convert("RGB")
+            pil.thumbnail((w, h), Image.Resampling.LANCZOS)
+            return np.ascontiguousarray(pil)
+        import cv2
+        ph, pw = self.pixels.shape[:2]
+        scale = min(w / pw, h / ph)
+        if scale >= 1: return self.pixels
+        return cv2.resize(self.pixels, (max(1, int(pw * scale)), max(1, int(ph * scale))), interpolation=cv2.INTER_AREA)
+
+    def preview(self, max_side=PREVIEW_SIZE):
+        return downscale(self.pixels, max_side)
+
+
+def downscale(pixels, max_side):
+    # Area-resampled so the longest side is at most max_side; smaller images are returned as-is
+    import cv2
+    h, w = pixels.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1: return pixels
+    return cv2.resize(pixels, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def encode_overlay(pixels, max_side=CACHE_OVERLAY_SIZE):
+    import cv2
+    pixels = downscale(pixels, max_side)
+    ok, buf = cv2.imencode(".jpg", cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buf.tobytes() if ok else None
+
+
+def decode_overlay(blob):
+    import cv2
+    img = cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return None if img is None else cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def encode_grid(grid):
+    buf = io.BytesIO()
+    np.save(buf, grid.astype(np.float16))
+    return buf.getvalue()
+
+
+def decode_grid(blob):
+    return np.load(io.BytesIO(blob)).astype(np.float32)
+
+
+class SharedFrame:
+    # Decoded pixels parked in shared memory so process-pool jobs can read them without re-decoding or pickling
+    def __init__(self, pixels):
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, pixels.nbytes))
+        self.name = self.shm.name
+        self.shape = pixels.shape
+        self.view()[:] = pixels
+
+    def view(self):
+        return np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    def release(self):
+        if self.shm is None: return
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class VisionProcessor:
+    # DJI writes its fix into XMP as well (older firmware spells it "GpsLongtitude")
+    XMP_GPS = {key: re.compile(rf'{pattern}\s*(?:=\s*"|>)\s*([-+]?\d+(?:\.\d+)?)')
+               for key, pattern in (("lat", r"GpsLatitude"), ("lon", r"GpsLongt?itude"), ("alt", r"AbsoluteAltitude"))}
+
+    @staticmethod
+    def read_geotag(image):
+        # (lat, lon, altitude or None) in decimal degrees / metres, or None. Reads the EXIF GPS IFD (or the
+        # drone XMP packet) that Image.open() parses from the header; pixels are never decoded.
+        try:
+            if isinstance(image, DecodedImage):
+                exif, xmp = image.exif, image.xmp
+            else:
+                with Image.open(image) as pil:
+                    exif, xmp = pil.getexif(), pil.info.get("xmp")
+            gps = exif.get_ifd(0x8825) if exif else {}
+            if 2 in gps and 4 in gps:
+                lat = sum(float(v) / 60 ** i for i, v in enumerate(gps[2]))
+                lon = sum(float(v) / 60 ** i for i, v in enumerate(gps[4]))
+                if str(gps.get(1, "N")).upper().startswith("S"): lat = -lat
+                if str(gps.get(3, "E")).upper().startswith("W"): lon = -lon
+                alt = float(gps[6]) if 6 in gps else None
+                if alt is not None and gps.get(5) in (1, b"\x01"): alt = -alt
+            elif xmp:
+                text = xmp.decode("utf-8", "ignore") if isinstance(xmp, bytes) else str(xmp)
+                found = {key: rx.search(text) for key, rx in VisionProcessor.XMP_GPS.items()}
+                if not (found["lat"] and found["lon"]): return None
+                lat, lon = float(found["lat"].group(1)), float(found["lon"].group(1))
+                alt = float(found["alt"].group(1)) if found["alt"] else None
+            else:
+                return None
+        except:
+            return None
+        # Receivers without a fix write 0/0
+        if (lat == 0 and lon == 0) or not (-90 <= lat <= 90 and -180 <= lon <= 180): return None
+        return lat, lon, alt
+
+    @staticmethod
+    def format_geotag(geotag):
+        if not geotag: return "N/A"
+        lat, lon, alt = geotag
+        text = f"{abs(lat):.5f}° {'N' if lat >= 0 else 'S'}, {abs(lon):.5f}° {'E' if lon >= 0 else 'W'}"
+        return text if alt is None else f"{text}, {alt:.0f} m"
+
+    @staticmethod
+    def get_exif_gps(image):
+        return VisionProcessor.format_geotag(VisionProcessor.read_geotag(image))
+
+    @staticmethod
+    def process_xray(image):
+        try:
+            img = DecodedImage.of(image).pixels
+        except:
+            return None, "N/A"
+        result, max_px, _ = VisionProcessor.analyze_xray(img)
+        return result, VisionProcessor.describe_width(max_px)
+
+    @staticmethod
+    def severity(max_px):
+        severity = "Micro"
+        if max_px > 10: severity = "Hairline"
+        if max_px > 30: severity = "Moderate"
+        if max_px > 80: severity = "Severe"
+        return severity
+
+    @staticmethod
+    def describe_width(max_px):
+        return f"{max_px}px ({VisionProcessor.severity(max_px)})"
+
+    @staticmethod
+    def edge_mask(img):
+        import cv2
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        edges = cv2.Canny(blurred, 50, 150)
+        kernel = np.ones((3, 3), np.uint8)
+        return cv2.dilate(edges, kernel, iterations=1)
+
+    @staticmethod
+    def edge_span(image, max_side=CASCADE_THUMBNAIL):
+        # Cascade pre-filter score: long side of the largest connected edge structure in a small thumbnail, as
+        # a fraction of the thumbnail's long side. Pores and aggregate stay near 0, a crack runs across the frame.
+        # JPEGs are DCT-scaled by draft(), so rejected frames are never decoded at full resolution.
+        import cv2
+        gray = cv2.cvtColor(DecodedImage.of(image).thumbnail((max_side, max_side)), cv2.COLOR_RGB2GRAY)
+        edges = cv2.dilate(cv2.Canny(cv2.GaussianBlur(gray, (3, 3), 0), 50, 150), np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(edges, connectivity=8)
+        if count < 2: return 0.0
+        return float(stats[1:, cv2.CC_STAT_WIDTH:cv2.CC_STAT_HEIGHT + 1].max()) / max(gray.shape)
+
+    @staticmethod
+    def tile_starts(length, tile=TILE_SIZE, stride=TILE_STRIDE):
+        # Overlapping tile offsets along one axis; the last tile sits flush with the far edge
+        starts = list(range(0, length - tile + 1, stride))
+        if starts[-1] != length - tile: starts.append(length - tile)
+        return np.array(starts)
+
+    @staticmethod
+    def select_tiles(mask, tile=TILE_SIZE, stride=TILE_STRIDE, min_edges=TILE_MIN_EDGE_FRACTION):
+        # Returns (active, origins): the tile grid as a bool array of tiles with enough edge pixels to be worth a
+        # forward pass, and the (y, x) origin of each active tile in row-major order. (None, None) if the frame
+        # is smaller than one tile. Edge counts for every tile come from a single integral image.
+        import cv2
+        h, w = mask.shape[:2]
+        if h < tile or w < tile: return None, None
+        ys = VisionProcessor.tile_starts(h, tile, stride)
+        xs = VisionProcessor.tile_starts(w, tile, stride)
+        integral = cv2.integral((mask > 0).astype(np.uint8))
+        y0, x0 = np.meshgrid(ys, xs, indexing="ij")
+        counts = (integral[y0 + tile, x0 + tile] - integral[y0, x0 + tile]
+                  - integral[y0 + tile, x0] + integral[y0, x0])
+        active = counts >= min_edges * tile * tile
+        rows, cols = np.nonzero(active)
+        return active, np.stack([ys[rows], xs[cols]], axis=1)
+
+    @staticmethod
+    def heatmap_overlay(img, grid, tile=TILE_SIZE, stride=TILE_STRIDE, cell=8):
+        # Crack probability per pixel = the highest score of the tiles covering it, built on a coarse cell
+        # lattice and upsampled. Opacity follows probability, so tiles the model calls safe stay untouched.
+        import cv2
+        h, w = img.shape[:2]
+        ys = VisionProcessor.tile_starts(h, tile, stride) // cell
+        xs = VisionProcessor.tile_starts(w, tile, stride) // cell
+        span = tile // cell
+        heat = np.zeros((-(-h // cell), -(-w // cell)), dtype=np.float32)
+        for r, c in zip(*np.nonzero(grid)):
+            cells = heat[ys[r]:ys[r] + span, xs[c]:xs[c] + span]
+            np.maximum(cells, grid[r, c], out=cells)
+        heat = cv2.resize((heat * 255).astype(np.uint8), (w, h), interpolation=cv2.INTER_LINEAR)
+        colors = cv2.cvtColor(cv2.applyColorMap(heat, cv2.COLORMAP_JET), cv2.COLOR_BGR2RGB)
+        result = img.copy()
+        for y in range(0, h, 256):
+            alpha = heat[y:y + 256, :, None].astype(np.float32) * (0.7 / 255)
+            strip = img[y:y + 256].astype(np.float32)
+            result[y:y + 256] = (strip + (colors[y:y + 256] - strip) * alpha).astype(np.uint8)
+        return result
+
+    @staticmethod
+    def analyze_xray(img, dilated=None, grid=None, paint=True):
+        # With a tile probability grid the overlay shows what the model flagged; edges still give the width.
+        # Without one the edge overlay is only painted when asked (paint=False returns img as is): on a frame
+        # the model calls safe it would just highlight joints and texture.
+        import cv2
+        if dilated is None: dilated = VisionProcessor.edge_mask(img)
+
+        # One labelling pass gives every crack's bounding box; width is its short side, as before
+        widths = VisionProcessor.crack_widths(dilated)
+        max_px = int(widths[0]) if len(widths) else 0
+
+        if grid is not None: return VisionProcessor.heatmap_overlay(img, grid), max_px, widths
+        if not paint: return img, max_px, widths
+
+        # The mask is binary, so the JET heatmap is a single colour
+        mask = dilated > 0
+        result = img.copy()
+        if mask.any():
+            color = cv2.applyColorMap(np.full((1, 1), 255, np.uint8), cv2.COLORMAP_JET)[0, 0, ::-1]
+            pixels = img[mask]
+            result[mask] = cv2.addWeighted(pixels, 0.2, np.broadcast_to(color, pixels.shape).copy(), 0.8, 0)
+        return result, max_px, widths
+
+    @staticmethod
+    def crack_widths(mask):
+        # Per-crack widths in px, widest first
+        import cv2
+        _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        widths = np.minimum(stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT])
+        return np.sort(widths)[::-1]
+
+
+def xray_width_job(name, shape):
+    # Process-pool entry point: reads the parent's SharedFrame; (max width in px, seconds spent) come back.
+    # Only the width is needed, so no overlay is painted.
+    started = time.perf_counter()
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        widths = VisionProcessor.crack_widths(VisionProcessor.edge_mask(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)))
+        return int(widths[0]) if len(widths) else 0, time.perf_counter() - started
+    finally:
+        shm.close()
+
+
+# =============================================================================
+#  PDF GENERATOR
+# =============================================================================
+class ReportGenerator:
+    # Header colour; the GUI keeps it in step with the theme accent
+    ACCENT = "#d63031"
+
+    @staticmethod
+    def report_image(source, box_w, box_h, dpi=REPORT_IMAGE_DPI):
+        # Resampled to the slot's print resolution and re-encoded, instead of embedding the original file.
+        # source is an image path or an RGB array (e.g. the X-ray overlay); box is in points.
+        from reportlab.platypus import Image as PlatImage
+        size = (int(box_w / 72 * dpi), int(box_h / 72 * dpi))
+        if isinstance(source, np.ndarray):
+            pil = Image.fromarray(source)
+            pil.thumbnail(size, Image.Resampling.LANCZOS)
+        else:
+            pil = ReportGenerator.report_thumbnail(source, size)
+        if pil is None: return None
+        buf = io.BytesIO()
+        pil.save(buf, "JPEG", quality=REPORT_JPEG_QUALITY, optimize=True)
+        buf.seek(0)
+        scale = min(box_w / pil.width, box_h / pil.height)
+        return PlatImage(buf, pil.width * scale, pil.height * scale)
+
+    @staticmethod
+    def create_single_report(filepath, image_path, analysis_data, xray=None):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.colors import HexColor, white
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        doc = SimpleDocTemplate(filepath, pagesize=A4)
+        elements = []
+        styles = getSampleStyleSheet()
+        header_style = ParagraphStyle('Header', parent=styles['Heading1'],
+                                      textColor=HexColor(ReportGenerator.ACCENT), alignment=1)
+        elements.append(Paragraph(f"{APP_NAME} Inspection Report", header_style))
+        elements.append(Spacer(1, 12))
+        elements.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
+        elements.append(Spacer(1, 24))
+        if xray is None:
+            images = ReportGenerator.report_image(image_path, 5 * inch, 3 * inch)
+        else:
+            # Original and X-ray overlay side by side, each in half the 6.4 inch text width
+            images = Table([[ReportGenerator.report_image(image_path, 3.1 * inch, 2.4 * inch),
+                             ReportGenerator.report_image(xray, 3.1 * inch, 2.4 * inch)],
+                            ["Original", "Thermal X-Ray"]], colWidths=[3.2 * inch, 3.2 * inch])
+            images.setStyle(TableStyle([
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+                ('TEXTCOLOR', (0, 1), (-1, 1), HexColor(ReportGenerator.ACCENT))
+            ]))
+        data = [
+            ["Analysis Parameter", "Value"],
+            ["File Name", os.path.basename(image_path)],
+            ["Detection Result", analysis_data['result']],
+            ["Confidence Score", f"{int(analysis_data['confidence'] * 100)}%"],
+            ["Structural Condition", analysis_data['width']],
+            ["Geo-Location", analysis_data['gps']],
+            ["AI Model", f"{APP_NAME} Core v5"]
+        ]
+        t = Table(data, colWidths=[2.5 * inch, 4 * inch])
+        t.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (1, 0), HexColor(ReportGenerator.ACCENT)),
+            ('TEXTCOLOR', (0, 0), (1, 0), white),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), HexColor('#f5f5f5')),
+            ('GRID', (0, 0), (-1, -1), 1, white)
+        ]))
+        if images is not None: elements.append(images)
+        elements.append(Spacer(1, 24))
+        elements.append(t)
+        doc.build(elements)
+
+    @staticmethod
+    def create_batch_report(filepath, batch_data, include_defects=True):
+        for _ in ReportGenerator.iter_batch_report(filepath, batch_data, include_defects): pass
+
+    @staticmethod
+    def report_thumbnail(path, size):
+        # JPEGs are DCT-scaled while decoding, so a gallery page never holds full-resolution frames
+        try:
+            pil = Image.open(path)
+            pil.draft("RGB", size)
+            pil = pil.convert("RGB")
+            pil.thumbnail(size, Image.Resampling.LANCZOS)
+            return pil
+        except:
+            return None
+
+    @staticmethod
+    def iter_batch_report(filepath, batch_data, include_defects=True, rows_per_page=REPORT_ROWS_PER_PAGE):
+        # Draws straight onto the canvas a page at a time: one fixed-size Table per page, then optional defect
+        # thumbnail pages. Nothing accumulates across pages, so memory stays flat and time linear for large
+        # missions. Yields (page, pages) after each finished page.
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.colors import HexColor, white
+        from reportlab.lib.utils import ImageReader
+        from reportlab.pdfgen import canvas
+        from reportlab.platypus import Table, TableStyle, Paragraph
+        from reportlab.lib.styles import getSampleStyleSheet
+        width, height = A4
+        margin = 50
+        styles = getSampleStyleSheet()
+        total = len(batch_data)
+        cracks = sum(1 for item in batch_data if item['result'] == "CRACK")
+        screened = sum(1 for item in batch_data if item['result'] == "SCREENED")
+        linked = sum(1 for item in batch_data if item.get('linked_to'))
+        first_rows = rows_per_page - 6 - bool(linked) - bool(screened)
+        table_pages = 1 + max(0, -(-(total - first_rows) // rows_per_page))
+        defect_pages = -(-cracks // REPORT_THUMBS_PER_PAGE) if include_defects else 0
+        pages = table_pages + defect_pages
+        style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), HexColor(ReportGenerator.ACCENT)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [HexColor('#f9f9f9'), white]),
+            ('GRID', (0, 0), (-1, -1), 0.5, HexColor('#e0e0e0'))
+        ])
+        c = canvas.Canvas(filepath, pagesize=A4)
+        page = 0
+
+        def draw(flowable, y):
+            _, h = flowable.wrapOn(c, width - 2 * margin, y)
+            flowable.drawOn(c, margin, y - h)
+            return y - h
+
+        def finish_page():
+            nonlocal page
+            page += 1
+            c.setFont("Helvetica", 8)
+            c.drawRightString(width - margin, margin / 2, f"Page {page} / {pages}")
+            c.showPage()
+
+        y = draw(Paragraph(f"{APP_NAME} Batch Survey Report", styles['Title']), height - margin)
+        y = draw(Paragraph(f"Total Scanned: {total} | Date: {datetime.now().strftime('%Y-%m-%d')}",
+                           styles['Normal']), y) - 12
+        summary = f"Summary: {cracks} Cracks Detected / {total - cracks - screened} Safe"
+        if screened: summary += f" / {screened} Screened"
+        y = draw(Paragraph(summary, styles['Heading2']), y) - 12
+        if linked:
+            y = draw(Paragraph(f"* {linked} near-duplicate frames carry the result of an earlier, near-identical frame",
+                               styles['Normal']), y) - 6
+        if screened:
+            y = draw(Paragraph(f"{screened} frames were screened out by the edge pre-filter and never reached the model",
+                               styles['Normal']), y) - 6
+        start, count = 0, first_rows
+        while True:
+            rows = [["ID", "Filename", "Result", "Confidence", "Condition"]]
+            for i in range(start, min(start + count, total)):
+                item = batch_data[i]
+                name = item['filename'] + (" *" if item.get('linked_to') else "")
+                confidence = "-" if item['result'] == "SCREENED" else f"{int(item['confidence'] * 100)}%"
+                rows.append([str(i + 1), name, item['result'], confidence, item['width']])
+            table = Table(rows, colWidths=[45, 190, 70, 80, 110])
+            table.setStyle(style)
+            draw(table, y)
+            start += count
+            finish_page()
+            yield page, pages
+            if start >= total: break
+            y, count = height - margin, rows_per_page
+
+        if include_defects and cracks:
+            cols = 2
+            cell_w = (width - 2 * margin) / cols
+            cell_h = (height - 2 * margin - 30) / (REPORT_THUMBS_PER_PAGE // cols)
+            slot = 0
+            for item in batch_data:
+                if item['result'] != "CRACK": continue
+                if slot == 0:
+                    c.setFont("Helvetica-Bold", 16)
+                    c.drawString(margin, height - margin - 16, "Defect Gallery")
+                x = margin + (slot % cols) * cell_w
+                top = height - margin - 30 - (slot // cols) * cell_h
+                box_w, box_h = cell_w - 10, cell_h - 40
+                thumb = ReportGenerator.report_thumbnail(item.get('path', ''), (int(box_w * 2), int(box_h * 2)))
+                if thumb is not None:
+                    scale = min(box_w / thumb.width, box_h / thumb.height)
+                    c.drawImage(ImageReader(thumb), x, top - thumb.height * scale, thumb.width * scale,
+                                thumb.height * scale)
+                c.setFont("Helvetica-Bold", 9)
+                c.drawString(x, top - box_h - 14, item['filename'][:60])
+                c.setFont("Helvetica", 9)
+                c.drawString(x, top - box_h - 26, f"{int(item['confidence'] * 100)}% | {item['width']} | {item['gps']}")
+                slot += 1
+                if slot == REPORT_THUMBS_PER_PAGE:
+                    slot = 0
+                    finish_page()
+                    yield page, pages
+            if slot:
+                finish_page()
+                yield page, pages
+        c.save()
+
+
+# =============================================================================
+#  HISTORY STORE
+# =============================================================================
+class HistoryStore:
+    # Append-only scan log in SQLite (WAL): O(1) inserts, indexed lookups by time/file/result,
+    # keyset-paged reads (newest first), age/row-count retention and VACUUM compaction.
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.lock = Lock()
+        try:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                time TEXT NOT NULL,
+                file TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                result TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scans_ts ON scans(ts);
+            CREATE INDEX IF NOT EXISTS idx_scans_file ON scans(file);
+            CREATE INDEX IF NOT EXISTS idx_scans_result ON scans(result);
+        """)
+        self.conn.commit()
+        if path != ":memory:": self._import_legacy_json()
+
+    def _import_legacy_json(self):
+        if not os.path.exists(LEGACY_HISTORY_FILE): return
+        try:
+            with open(LEGACY_HISTORY_FILE, 'r') as f:
+                entries = json.load(f)
+            ts = os.path.getmtime(LEGACY_HISTORY_FILE)
+            # The JSON log is newest-first; insert oldest-first so row ids keep the original order
+            rows = [(ts, e.get('time', ''), e.get('file', ''), float(e.get('confidence', 0.0)), e.get('result', ''))
+                    for e in reversed(entries)]
+            with self.lock:
+                self.conn.executemany("INSERT INTO scans (ts, time, file, confidence, result) VALUES (?, ?, ?, ?, ?)",
+                                      rows)
+                self.conn.commit()
+            os.replace(LEGACY_HISTORY_FILE, LEGACY_HISTORY_FILE + ".migrated")
+        except:
+            pass
+
+    def append(self, file, confidence, result):
+        now = datetime.now()
+        with self.lock:
+            self.conn.execute("INSERT INTO scans (ts, time, file, confidence, result) VALUES (?, ?, ?, ?, ?)",
+                              (now.timestamp(), now.strftime("%H:%M:%S"), file, float(confidence), result))
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+
+    def page(self, limit=HISTORY_PAGE_SIZE, before_id=None, result=None, file=None):
+        where, args = [], []
+        if before_id is not None:
+            where.append("id < ?")
+            args.append(before_id)
+        if result is not None:
+            where.append("result = ?")
+            args.append(result)
+        if file is not None:
+            where.append("file = ?")
+            args.append(file)
+        sql = "SELECT id, ts, time, file, confidence, result FROM scans"
+        if where: sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self.lock:
+            rows = self.conn.execute(sql, (*args, limit)).fetchall()
+        return [{"id": r[0], "ts": r[1], "time": r[2], "file": r[3], "confidence": r[4], "result": r[5]} for r in rows]
+
+    def apply_retention(self, max_age_days=HISTORY_RETENTION_DAYS, max_rows=HISTORY_MAX_ROWS):
+        with self.lock:
+            deleted = 0
+            if max_age_days:
+                cutoff = time.time() - max_age_days * 86400
+                deleted += self.conn.execute("DELETE FROM scans WHERE ts < ?", (cutoff,)).rowcount
+            if max_rows:
+                deleted += self.conn.execute(
+                    "DELETE FROM scans WHERE id <= (SELECT id FROM scans ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (max_rows,)).rowcount
+            self.conn.commit()
+        return deleted
+
+    def compact(self, min_free_ratio=0.25):
+        with self.lock:
+            pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if pages and free / pages >= min_free_ratio:
+                self.conn.execute("VACUUM")
+                return True
+        return False
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+# =============================================================================
+#  SPATIAL INDEX
+# =============================================================================
+class GeoIndex:
+    # Where each geotagged image was scanned, for radius queries such as "Severe cracks within 50 m of pier 3".
+    # Points sit in an SQLite R*Tree (an indexed latitude band where SQLite is built without it); the index
+    # cuts a query down to its bounding box and exact haversine distance filters the few candidates left.
+    EARTH_RADIUS_M = 6371008.8
+
+    def __init__(self, path=GEO_INDEX_FILE):
+        self.lock = Lock()
+        try:
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS points (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                alt REAL,
+                result TEXT NOT NULL,
+                severity TEXT NOT NULL,
+                width_px INTEGER NOT NULL,
+                confidence REAL NOT NULL,
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_points_lat ON points(lat);
+        """)
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS points_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+            self.rtree = True
+        except sqlite3.OperationalError:
+            self.rtree = False
+        self.conn.commit()
+
+    def add(self, path, geotag, result, confidence, width_px):
+        lat, lon, alt = geotag
+        # Edge width only grades a crack; SAFE and SCREENED frames with wide texture edges get no severity
+        severity = VisionProcessor.severity(width_px) if result == "CRACK" else ""
+        row = (lat, lon, alt, result, severity, int(width_px), float(confidence), time.time())
+        with self.lock:
+            old = self.conn.execute("SELECT id FROM points WHERE path = ?", (path,)).fetchone()
+            if old:
+                point_id = old[0]
+                self.conn.execute("UPDATE points SET lat = ?, lon = ?, alt = ?, result = ?, severity = ?, width_px = ?, "
+                                  "confidence = ?, ts = ? WHERE id = ?", (*row, point_id))
+            else:
+                point_id = self.conn.execute("INSERT INTO points (path, lat, lon, alt, result, severity, width_px, "
+                                             "confidence, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (path, *row)).lastrowid
+            if self.rtree:
+                self.conn.execute("INSERT OR REPLACE INTO points_rtree VALUES (?, ?, ?, ?, ?)", (point_id, lat, lat, lon, lon))
+
+    def near(self, lat, lon, radius_m, result=None, severity=None, limit=None):
+        # Scans within radius_m metres of (lat, lon), nearest first; result/severity narrow it ("CRACK", "Severe").
+        # Frames the cascade screened out have no real verdict and only come back when asked for ("SCREENED").
+        # A severity filter implies result "CRACK", which also covers rows indexed before SAFE frames stopped getting one.
+        dlat = math.degrees(radius_m / self.EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        box = (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+        if self.rtree:
+            sql = ("SELECT p.path, p.lat, p.lon, p.alt, p.result, p.severity, p.width_px, p.confidence, p.ts "
+                   "FROM points_rtree r JOIN points p ON p.id = r.id "
+                   "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?")
+        else:
+            sql = ("SELECT p.path, p.lat, p.lon, p.alt, p.result, p.severity, p.width_px, p.confidence, p.ts "
+                   "FROM points p WHERE p.lat >= ? AND p.lat <= ? AND p.lon >= ? AND p.lon <= ?")
+        args = list(box)
+        if severity and not result: result = "CRACK"
+        if result:
+            sql += " AND p.result = ?"
+            args.append(result)
+        else:
+            sql += " AND p.result != 'SCREENED'"
+        if severity:
+            sql += " AND p.severity = ?"
+            args.append(severity)
+        with self.lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        hits = []
+        for row in rows:
+            distance = self.distance(lat, lon, row[1], row[2])
+            if distance > radius_m: continue
+            hits.append({"path": row[0], "lat": row[1], "lon": row[2], "alt": row[3], "result": row[4],
+                         "severity": row[5], "width_px": row[6], "confidence": row[7],
+                         "time": datetime.fromtimestamp(row[8]).isoformat(timespec="seconds"),
+                         "distance_m": round(distance, 2)})
+        hits.sort(key=lambda h: h["distance_m"])
+        return hits[:limit] if limit else hits
+
+    @classmethod
+    def distance(cls, lat1, lon1, lat2, lon2):
+        p1, p2 = math.radians(lat1), math.radians(lat2)
+        a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+        return 2 * cls.EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+
+# =============================================================================
+#  RESULT CACHE
+# =============================================================================
+def file_fingerprint(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # Analysis results keyed by image content hash + model fingerprint, so unchanged frames skip decode,
+    # inference and X-ray. Size-bounded with LRU eviction; a path/mtime/size memo lets hits skip reading
+    # the file at all.
+    ROW_OVERHEAD = 256
+
+    def __init__(self, path=RESULT_CACHE_FILE, max_bytes=CACHE_MAX_BYTES, read_only=False):
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        # Read-only caches (scan shards) never touch the file; their writes queue up in `deferred` and the
+        # coordinator replays them with apply()
+        self.read_only = read_only
+        self.deferred = []
+        self.total_bytes = 0
+        if read_only:
+            from urllib.request import pathname2url
+            try:
+                self.conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True,
+                                            timeout=30, check_same_thread=False)
+                self.conn.execute("SELECT 1 FROM results JOIN files LIMIT 1").fetchall()
+                return
+            except sqlite3.Error:
+                path = ":memory:"
+        try:
+            # Sharded scans write from several processes at once; wait for the WAL write lock instead of failing
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                digest TEXT NOT NULL,
+                model TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                width_px INTEGER NOT NULL,
+                severity TEXT NOT NULL,
+                gps TEXT NOT NULL,
+                overlay BLOB,
+                tiles BLOB,
+                lat REAL,
+                lon REAL,
+                alt REAL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (digest, model)
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            );
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(results)")]
+        if "tiles" not in columns:
+            self.conn.execute("ALTER TABLE results ADD COLUMN tiles BLOB")
+        if "lat" not in columns:
+            for column in ("lat", "lon", "alt"):
+                self.conn.execute(f"ALTER TABLE results ADD COLUMN {column} REAL")
+            # Rows from before real GPS parsing carry a placeholder location; drop them so they get rescanned
+            self.conn.execute("DELETE FROM results WHERE gps != 'N/A'")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def known_digest(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT mtime, size, digest FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_mtime and row[1] == st.st_size: return row[2]
+        return None
+
+    def _defer(self, name, *args):
+        if not self.read_only: return False
+        with self.lock:
+            self.deferred.append((name, args))
+        return True
+
+    def drain(self):
+        with self.lock:
+            writes, self.deferred = self.deferred, []
+        return writes
+
+    def apply(self, writes):
+        for name, args in writes or ():
+            getattr(self, name)(*args)
+
+    def remember_file(self, image):
+        st = os.stat(image.path)
+        self.remember(image.path, st.st_mtime, st.st_size, image.digest)
+
+    def remember(self, path, mtime, size, digest):
+        if self._defer("remember", path, mtime, size, digest): return
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO files (path, mtime, size, digest) VALUES (?, ?, ?, ?)",
+                              (path, mtime, size, digest))
+
+    def touch(self, digest, model):
+        if self._defer("touch", digest, model): return
+        with self.lock:
+            self.conn.execute("UPDATE results SET last_used = ? WHERE digest = ? AND model = ?",
+                              (time.time(), digest, model))
+
+    def get(self, digest, model):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT confidence, width_px, severity, gps, overlay, tiles, lat, lon, alt FROM results "
+                "WHERE digest = ? AND model = ?", (digest, model)).fetchone()
+        if row is None: return None
+        self.touch(digest, model)
+        return {"digest": digest, "confidence": row[0], "width_px": row[1], "severity": row[2],
+                "width": f"{row[1]}px ({row[2]})", "gps": row[3], "overlay": row[4],
+                "tiles": decode_grid(row[5]) if row[5] is not None else None,
+                "geotag": (row[6], row[7], row[8]) if row[6] is not None else None}
+
+    def put(self, digest, model, confidence, width_px, gps, overlay=None, tiles=None, geotag=None):
+        if self._defer("put", digest, model, confidence, width_px, gps, overlay, tiles, geotag): return
+        size = self.ROW_OVERHEAD + len(overlay or b"") + len(tiles or b"")
+        lat, lon, alt = geotag or (None, None, None)
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM results WHERE digest = ? AND model = ?",
+                                    (digest, model)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (digest, model, confidence, width_px, severity, gps, overlay, tiles, "
+                "lat, lon, alt, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, model, float(confidence), int(width_px), VisionProcessor.severity(width_px), gps, overlay,
+                 tiles, lat, lon, alt, size, time.time()))
+            self.total_bytes += size - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes: self._evict(int(self.max_bytes * 0.9))
+
+    def _evict(self, target):
+        while self.total_bytes > target:
+            rows = self.conn.execute(
+                "SELECT rowid, size FROM results ORDER BY last_used LIMIT 256").fetchall()
+            if not rows: break
+            victims = []
+            for rowid, size in rows:
+                victims.append((rowid,))
+                self.total_bytes -= size
+                if self.total_bytes <= target: break
+            self.conn.executemany("DELETE FROM results WHERE rowid = ?", victims)
+
+    def purge_models(self, keep_model):
+        # Keeps every inference mode of the current model (keys are "<fingerprint>" or "<fingerprint>/<mode>")
+        with self.lock:
+            self.conn.execute("DELETE FROM results WHERE model != ? AND model NOT LIKE ?",
+                              (keep_model, keep_model + "/%"))
+            self.conn.execute("DELETE FROM files WHERE digest NOT IN (SELECT digest FROM results)")
+            self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            self.conn.commit()
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+
+
+# =============================================================================
+#  IMAGE DISCOVERY
+# =============================================================================
+def path_matches(rel, name, patterns):
+    return any(fnmatch(rel, p) or fnmatch(name, p) for p in patterns)
+
+
+def discover_images(folder, include=(), exclude=(), dedup=True):
+    # Depth-first os.scandir walk of a survey tree (flight/date subfolders), yielding image paths as they are
+    # found so a scan can start on the first folder while the rest is still being listed. Globs match the path
+    # relative to `folder` or the bare name; exclude also prunes directories. Byte-identical copies are skipped,
+    # and a file is only hashed once another file of the same size turns up.
+    first_of_size = {}
+    digests = set()
+
+    def is_copy(path, size):
+        first = first_of_size.get(size, False)
+        if first is False:
+            first_of_size[size] = path
+            return False
+        try:
+            if first is not None:
+                digests.add(file_fingerprint(first))
+                first_of_size[size] = None
+            digest = file_fingerprint(path)
+        except OSError:
+            return False
+        if digest in digests: return True
+        digests.add(digest)
+        return False
+
+    stack = [folder]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            rel = os.path.relpath(entry.path, folder).replace(os.sep, "/")
+            if path_matches(rel, entry.name, exclude): continue
+            try:
+                # Symlinked folders are not followed, so link cycles can't loop the walk
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file(): continue
+                if include and not path_matches(rel, entry.name, include): continue
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            if dedup and is_copy(entry.path, size): continue
+            yield entry.path
+        stack.extend(reversed(subdirs))
+
+
+class FolderWatcher:
+    # Live ingestion from a folder a drone is still uploading into. Plain polling (portable, no extra dependency)
+    # kept cheap by stat-ing each directory and only re-listing the ones whose mtime moved. A new image is held
+    # back until its size and mtime are unchanged between two polls and it is `settle` seconds old, so files
+    # that are still being copied in are never decoded half-written.
+    def __init__(self, folder, include=(), exclude=(), poll=WATCH_POLL_SECONDS, settle=WATCH_SETTLE_SECONDS):
+        self.folder = folder
+        self.include = include
+        self.exclude = exclude
+        self.poll_seconds = poll
+        self.settle = settle
+        self.dirs = {}
+        self.pending = {}
+        self.seen = set()
+
+    def _list(self, directory):
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            return None
+        subdirs, files = [], []
+        for entry in entries:
+            rel = os.path.relpath(entry.path, self.folder).replace(os.sep, "/")
+            if path_matches(rel, entry.name, self.exclude): continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                    if not self.include or path_matches(rel, entry.name, self.include): files.append(entry.path)
+            except OSError:
+                continue
+        return subdirs, files
+
+    def poll(self):
+        # One pass over the tree; returns the images that have settled since the last call, in arrival order
+        now = time.time()
+        stack = [self.folder]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                self.dirs.pop(directory, None)
+                continue
+            known = self.dirs.get(directory)
+            # Coarse-mtime filesystems (FAT, SMB) can hide a second write in the same tick, so recent dirs are re-listed
+            if known is None or known[0] != mtime or now - mtime < self.settle:
+                listing = self._list(directory)
+                if listing is None: continue
+                subdirs, files = listing
+                self.dirs[directory] = (mtime, subdirs)
+                for path in files:
+                    if path not in self.seen and path not in self.pending: self.pending[path] = None
+            else:
+                subdirs = known[1]
+            stack.extend(reversed(subdirs))
+        ready = []
+        for path, last in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            key = (st.st_mtime, st.st_size)
+            if key == last and now - st.st_mtime >= self.settle:
+                del self.pending[path]
+                self.seen.add(path)
+                ready.append(path)
+            else:
+                self.pending[path] = key
+        return ready
+
+    def watch(self, *stops):
+        # Endless path source for ScanPipeline; ends once any of the given Events is set
+        while not any(stop.is_set() for stop in stops):
+            for path in self.poll(): yield path
+            deadline = time.monotonic() + self.poll_seconds
+            while time.monotonic() < deadline and not any(stop.is_set() for stop in stops):
+                time.sleep(0.1)
+
+
+def perceptual_hash(image, size=NEAR_DUP_HASH_SIZE):
+    # size*size-bit DCT hash: the lowest-frequency coefficients of a grayscale thumbnail against their median.
+    # Unlike a gradient hash it ignores sensor noise on flat concrete; JPEGs are DCT-scaled by draft(), so this
+    # never needs the full-resolution decode
+    import cv2
+    thumb = Image.fromarray(DecodedImage.of(image).thumbnail((8 * size, 8 * size))).convert("L")
+    px = np.asarray(thumb.resize((4 * size, 4 * size), Image.Resampling.BILINEAR), dtype=np.float32)
+    coeffs = cv2.dct(px)[:size, :size].flatten()
+    return int.from_bytes(np.packbits(coeffs > np.median(coeffs[1:])).tobytes(), "big")
+
+
+class NearDuplicateIndex:
+    # Representative frames by perceptual hash. The hash is cut into max_distance + 1 chunks; two hashes
+    # within max_distance bits must agree exactly on at least one of them, so a lookup only compares against
+    # frames sharing a chunk instead of every representative seen so far.
+    def __init__(self, max_distance=NEAR_DUP_MAX_DISTANCE, bits=NEAR_DUP_HASH_SIZE ** 2):
+        self.max_distance = max_distance
+        bounds = np.linspace(0, bits, max_distance + 2).astype(int)
+        self.chunks = [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self.buckets = [{} for _ in self.chunks]
+        self.hashes = []
+        self.keys = []
+
+    def find(self, h):
+        best = None
+        for bucket, (shift, mask) in zip(self.buckets, self.chunks):
+            for idx in bucket.get((h >> shift) & mask, ()):
+                distance = bin(h ^ self.hashes[idx]).count("1")
+                if distance <= self.max_distance and (best is None or distance < best[0]): best = (distance, idx)
+        return self.keys[best[1]] if best else None
+
+    def add(self, h, key):
+        idx = len(self.hashes)
+        self.hashes.append(h)
+        self.keys.append(key)
+        for bucket, (shift, mask) in zip(self.buckets, self.chunks):
+            bucket.setdefault((h >> shift) & mask, []).append(idx)
+
+    def match(self, h, key):
+        # Key of the representative `h` duplicates, or None after registering `key` as a new representative
+        found = self.find(h)
+        if found is None: self.add(h, key)
+        return found
+
+
+# =============================================================================
+#  MISSION CHECKPOINTS
+# =============================================================================
+class MissionLog:
+    # Crash-safe record of one batch mission: manifest.json (folder, inference mode, state) plus results.jsonl,
+    # appended and flushed per image. Re-running an unfinished mission on the same folder keeps every result
+    # whose file is unchanged (same path, mtime and size) and only scans the rest. The file list isn't stored,
+    # since discovery streams it while the scan runs.
+    def __init__(self, folder, root=MISSIONS_DIR):
+        self.folder = os.path.abspath(folder)
+        mission_id = hashlib.sha1(os.path.normcase(self.folder).encode("utf-8")).hexdigest()[:16]
+        self.dir = os.path.join(root, mission_id)
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+        self.results_path = os.path.join(self.dir, "results.jsonl")
+        self.file = None
+        self.lock = Lock()
+
+    @staticmethod
+    def stat_key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except:
+            return None
+
+    def _write_manifest(self, manifest):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    def completed(self, mode):
+        # Results of an unfinished mission in the same inference mode whose files haven't changed since
+        manifest = self.read_manifest()
+        if not manifest or manifest.get("finished") or manifest.get("mode") != mode: return {}
+        done = {}
+        try:
+            with open(self.results_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    path = row.get("path")
+                    if path and self.stat_key(path) == (row.get("mtime"), row.get("size")):
+                        done[path] = row
+        except OSError:
+            return {}
+        return done
+
+    def begin(self, mode):
+        # Returns {path: row} for the files that don't need scanning again and opens the log for appending
+        done = self.completed(mode)
+        os.makedirs(self.dir, exist_ok=True)
+        manifest = self.read_manifest() if done else None
+        if not manifest:
+            manifest = {"folder": self.folder, "mode": mode, "created": datetime.now().isoformat()}
+        manifest.update({"finished": False, "updated": datetime.now().isoformat()})
+        self._write_manifest(manifest)
+        # Rewrite the kept rows so a torn line or stale entries never precede the new appends
+        tmp = self.results_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in done.values(): f.write(json.dumps(row) + "\n")
+        os.replace(tmp, self.results_path)
+        self.file = open(self.results_path, "a", encoding="utf-8")
+        return done
+
+    def append(self, row):
+        key = self.stat_key(row["path"])
+        if key is None: return
+        row = dict(row, mtime=key[0], size=key[1])
+        with self.lock:
+            if self.file is None: return
+            self.file.write(json.dumps(row) + "\n")
+            self.file.flush()
+
+    def close(self, finished=False):
+        with self.lock:
+            if self.file is None: return
+            self.file.close()
+            self.file = None
+        if finished:
+            manifest = self.read_manifest() or {}
+            manifest.update({"finished": True, "updated": datetime.now().isoformat()})
+            self._write_manifest(manifest)
+
+
+# =============================================================================
+#  SCAN METRICS
+# =============================================================================
+@contextmanager
+def stage_timer(timings, stage):
+    # Adds the block's monotonic wall time (seconds) to timings[stage]
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+class ScanMetrics:
+    # Where a scan's time goes. Each image comes out of the pipeline with its per-stage timings, which feed a
+    # cumulative histogram per stage (Prometheus export) and a rolling window of recent samples (live
+    # percentiles); images are counted by how they were resolved and the slowest few are kept. With a trace
+    # file open every image is also written out as a JSON line, to find outliers such as huge TIFFs.
+    KINDS = ("scanned", "cached", "linked", "screened", "error")
+
+    def __init__(self, window=METRICS_WINDOW, buckets=METRICS_BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self.lock = Lock()
+        self.trace = None
+        self.trace_path = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.counts = dict.fromkeys(self.KINDS, 0)
+            self.slowest = []
+            self.started = time.time()
+            if not self.trace: self.trace_path = None
+
+    def _observe(self, stage, seconds):
+        s = self.stages.get(stage)
+        if s is None:
+            s = self.stages[stage] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(self.buckets) + 1),
+                                      "recent": deque(maxlen=self.window)}
+        s["count"] += 1
+        s["sum"] += seconds
+        s["max"] = max(s["max"], seconds)
+        s["buckets"][bisect_left(self.buckets, seconds)] += 1
+        s["recent"].append(seconds)
+
+    def observe(self, stage, seconds):
+        # Work that isn't tied to one image (scan-log flushes)
+        with self.lock:
+            self._observe(stage, seconds)
+
+    def record(self, path, timings, kind, size=None, pixels=None):
+        total = sum(timings.values())
+        with self.lock:
+            self.counts[kind] += 1
+            for stage, seconds in timings.items(): self._observe(stage, seconds)
+            if len(self.slowest) < METRICS_SLOWEST or total > self.slowest[-1]["total_ms"] / 1000:
+                self.slowest.append({"path": path, "total_ms": total * 1000, "size": size, "pixels": pixels,
+                                     "stages": {k: v * 1000 for k, v in timings.items()}})
+                self.slowest.sort(key=lambda entry: entry["total_ms"], reverse=True)
+                del self.slowest[METRICS_SLOWEST:]
+            if self.trace:
+                self.trace.write(json.dumps({"path": path, "kind": kind, "size": size, "pixels": pixels,
+                                             "total_ms": round(total * 1000, 3),
+                                             "stages": {k: round(v * 1000, 3) for k, v in timings.items()}}) + "\n")
+
+    def start_trace(self, path):
+        self.stop_trace()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.lock:
+            self.trace = open(path, "w", encoding="utf-8", buffering=1)
+            self.trace_path = path
+
+    def stop_trace(self):
+        with self.lock:
+            if self.trace: self.trace.close()
+            self.trace = None
+
+    def snapshot(self):
+        # Times in ms; `share` is each stage's part of all per-image stage time (stages overlap across threads,
+        # so this is where the work goes, not a split of the wall clock)
+        with self.lock:
+            stages = {name: (s["count"], s["sum"], s["max"], list(s["buckets"]), sorted(s["recent"]))
+                      for name, s in self.stages.items()}
+            counts = dict(self.counts)
+            slowest = [dict(entry) for entry in self.slowest]
+            elapsed = time.time() - self.started
+        work = sum(total for name, (_, total, _, _, _) in stages.items() if name != "flush") or 1.0
+        out = {"elapsed_s": elapsed, "images": counts, "stages": {}, "slowest": slowest}
+        for name, (count, total, peak, buckets, recent) in stages.items():
+            cumulative = np.cumsum(buckets).tolist()
+            out["stages"][name] = {
+                "count": count, "sum_s": total, "mean_ms": total / count * 1000, "max_ms": peak * 1000,
+                "p50_ms": recent[len(recent) // 2] * 1000 if recent else 0.0,
+                "p95_ms": recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000 if recent else 0.0,
+                "share": total / work if name != "flush" else None,
+                "buckets": {**{f"{le:g}": n for le, n in zip(self.buckets, cumulative)}, "+Inf": cumulative[-1]}}
+        return out
+
+    def describe(self):
+        stages = sorted(self.snapshot()["stages"].items(), key=lambda entry: -entry[1]["sum_s"])
+        return ", ".join(f"{name} {s['mean_ms']:.1f} ms ({s['share']:.0%})" for name, s in stages
+                         if s["share"] is not None)
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = ["# HELP tensorcrete_stage_seconds Time spent in each scan stage, per image",
+                 "# TYPE tensorcrete_stage_seconds histogram"]
+        for name, s in sorted(snap["stages"].items()):
+            for le, n in s["buckets"].items():
+                lines.append(f'tensorcrete_stage_seconds_bucket{{stage="{name}",le="{le}"}} {n}')
+            lines.append(f'tensorcrete_stage_seconds_sum{{stage="{name}"}} {s["sum_s"]:.6f}')
+            lines.append(f'tensorcrete_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+        lines += ["# HELP tensorcrete_images_total Images out of the scan, by how they were resolved",
+                  "# TYPE tensorcrete_images_total counter"]
+        lines += [f'tensorcrete_images_total{{kind="{kind}"}} {n}' for kind, n in snap["images"].items()]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        # .json gets the full snapshot, anything else Prometheus text; replaced atomically so a textfile
+        # collector never reads half a file
+        text = json.dumps(self.snapshot(), indent=2) if path.lower().endswith(".json") else self.to_prometheus()
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+# =============================================================================
+#  INFERENCE RUNTIME
+# =============================================================================
+RUNTIME_MODELS = ((RUNTIME_MODEL_NAME, "TFLite"), (ONNX_MODEL_NAME, "ONNX"))
+
+
+def load_tflite_interpreter(path, num_threads=None):
+    # LiteRT / tflite-runtime ship the interpreter (with XNNPACK) without the rest of TensorFlow
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads or INFERENCE_THREADS)
+
+
+class TFLiteModel:
+    # Keras-compatible predict()/predict_on_batch() over a TFLite interpreter. One interpreter per batch
+    # shape, so the padded batch size and single-image calls never re-allocate tensors.
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.interpreters = {}
+        self._interpreter(1)
+
+    def _interpreter(self, batch_size):
+        interpreter = self.interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = load_tflite_interpreter(self.path)
+            inp = interpreter.get_input_details()[0]
+            if inp["shape"][0] != batch_size:
+                interpreter.resize_tensor_input(inp["index"], [batch_size, *inp["shape"][1:]])
+            interpreter.allocate_tensors()
+            self.interpreters[batch_size] = interpreter
+        return interpreter
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch)
+        with self.lock:
+            interpreter = self._interpreter(len(batch))
+            inp = interpreter.get_input_details()[0]
+            out = interpreter.get_output_details()[0]
+            scale, zero_point = inp["quantization"]
+            if np.issubdtype(inp["dtype"], np.integer) and scale:
+                info = np.iinfo(inp["dtype"])
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+            interpreter.set_tensor(inp["index"], batch.astype(inp["dtype"]))
+            interpreter.invoke()
+            scores = interpreter.get_tensor(out["index"])
+        scale, zero_point = out["quantization"]
+        if np.issubdtype(out["dtype"], np.integer) and scale:
+            scores = (scores.astype(np.float32) - zero_point) * scale
+        return scores
+
+    def predict(self, batch, verbose=0):
+        return self.predict_on_batch(batch)
+
+
+class OnnxModel:
+    def __init__(self, path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = INFERENCE_THREADS
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_on_batch(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+    def predict(self, batch, verbose=0):
+        return self.predict_on_batch(batch)
+
+
+def runtime_manifest_path(path):
+    return path + ".json"
+
+
+def select_runtime_model(keras_path):
+    # An exported artifact is only used if it passed its parity check and was built from the current .h5
+    # (when the .h5 is not shipped at all, the manifest alone vouches for it).
+    source = file_fingerprint(keras_path) if os.path.exists(keras_path) else None
+    for name, backend in RUNTIME_MODELS:
+        path = resource_path(name)
+        try:
+            with open(runtime_manifest_path(path), "r") as f:
+                manifest = json.load(f)
+        except:
+            continue
+        if not os.path.exists(path) or not manifest.get("passed"): continue
+        if source and manifest.get("source") != source: continue
+        return path, backend
+    return None
+
+
+def calibration_batches(paths, count=RUNTIME_PARITY_SAMPLES):
+    # Real frames when we have them, otherwise a fixed set of synthetic textures so the check is repeatable
+    images = []
+    for path in paths:
+        if len(images) >= count: break
+        try:
+            images.append(DecodedImage(path).model_input())
+        except:
+            pass
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 256, (*MODEL_INPUT_SIZE, 3), dtype=np.uint8) for _ in range(count)]
+    return [np.expand_dims(image, axis=0) for image in images]
+
+
+def check_parity(reference, candidate, batches):
+    expected = np.concatenate([np.asarray(reference.predict(b, verbose=0))[:, 0] for b in batches])
+    actual = np.concatenate([np.asarray(candidate.predict(b, verbose=0))[:, 0] for b in batches])
+    drift = float(np.max(np.abs(expected - actual)))
+    flips = int(np.sum((expected > 0.5) != (actual > 0.5)))
+    return drift, flips
+
+
+def export_runtime_model(keras_path, fmt="tflite", quantize=None, calibration_paths=()):
+    if fmt == "onnx":
+        missing = [name for name in ("tf2onnx", "onnxruntime") if importlib.util.find_spec(name) is None]
+        if missing:
+            raise RuntimeError(f"ONNX export needs {' and '.join(missing)} (pip install -r requirements-export.txt)")
+    import tensorflow as tf
+    model = tf.keras.models.load_model(keras_path)
+    batches = calibration_batches(calibration_paths)
+    if fmt == "tflite":
+        out_path = os.path.join(os.path.dirname(keras_path), RUNTIME_MODEL_NAME)
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantize in ("dynamic", "int8"):
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantize == "int8":
+            # Weights and activations in int8, ranges calibrated on sample frames; I/O stays float
+            converter.representative_dataset = lambda: ([b.astype(np.float32)] for b in batches)
+        with open(out_path, "wb") as f:
+            f.write(converter.convert())
+        runtime = TFLiteModel(out_path)
+    elif fmt == "onnx":
+        import tf2onnx
+        out_path = os.path.join(os.path.dirname(keras_path), ONNX_MODEL_NAME)
+        signature = (tf.TensorSpec((None, *MODEL_INPUT_SIZE, 3), tf.float32, name="input"),)
+        tf2onnx.convert.from_keras(model, input_signature=signature, output_path=out_path)
+        if quantize == "dynamic":
+            from onnxruntime.quantization import quantize_dynamic
+            quantize_dynamic(out_path, out_path)
+        elif quantize == "int8":
+            raise ValueError("int8 calibration is only supported for TFLite export")
+        runtime = OnnxModel(out_path)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    drift, flips = check_parity(model, runtime, batches)
+    manifest = {"source": file_fingerprint(keras_path), "format": fmt, "quantize": quantize or "none",
+                "samples": len(batches), "max_drift": drift, "flips": flips,
+                "passed": drift <= RUNTIME_PARITY_TOLERANCE and flips == 0,
+                "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    with open(runtime_manifest_path(out_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return out_path, manifest
+
+
+# =============================================================================
+#  BACKEND LOGIC
+# =============================================================================
+class CascadeStats:
+    # Outcome tallies of the two-stage cascade, for tuning its thresholds. Per screened frame:
+    #   rejected  - below the pre-filter threshold, no CNN and no X-ray
+    #   audited   - a rejected frame sampled for the CNN anyway, which agreed it is safe
+    #   missed    - a sampled reject the CNN calls cracked (a crack the pre-filter would have lost)
+    #   negative  - passed the pre-filter, CNN safe, no X-ray
+    #   positive  - passed the pre-filter, CNN cracked, full X-ray and width
+    OUTCOMES = ("rejected", "audited", "missed", "negative", "positive")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = dict.fromkeys(self.OUTCOMES, 0)
+            self.rejects = 0
+
+    def sample_reject(self, every=CASCADE_AUDIT_EVERY):
+        # True for every `every`-th pre-filter reject
+        with self.lock:
+            self.rejects += 1
+            return every > 0 and self.rejects % every == 0
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def summary(self):
+        with self.lock:
+            c = dict(self.counts)
+        screened = sum(c.values())
+        sampled = c["audited"] + c["missed"]
+        miss_rate = c["missed"] / sampled if sampled else 0.0
+        return {**c, "screened": screened,
+                "cnn_skip_rate": c["rejected"] / screened if screened else 0.0,
+                "xray_skip_rate": (c["rejected"] + c["audited"] + c["negative"]) / screened if screened else 0.0,
+                "audit_miss_rate": miss_rate,
+                "estimated_missed": round(miss_rate * c["rejected"], 1)}
+
+    def describe(self):
+        s = self.summary()
+        return (f"{s['screened']} screened, {s['cnn_skip_rate']:.0%} skipped the CNN, "
+                f"{s['xray_skip_rate']:.0%} skipped X-ray; audit: {s['missed']} of {s['audited'] + s['missed']} "
+                f"sampled rejects were cracks (~{s['estimated_missed']:g} missed)")
+
+
+class AI_Engine:
+    def __init__(self, history_path=HISTORY_FILE, read_only=False):
+        self.model = None
+        self.backend = None
+        self.model_fingerprint = None
+        # Held for every forward pass: the GUI's single-image predict() can run while a batch scan is using the model
+        self.model_lock = Lock()
+        self.tiled = False
+        # Minimum pre-filter edge span for a frame to reach the CNN in batch scans; None runs every frame
+        self.cascade = None
+        # Max perceptual-hash distance (bits) for batch scans to link a frame to an earlier near-duplicate; None links none
+        self.near_dup = None
+        self.cascade_stats = CascadeStats()
+        self.metrics = ScanMetrics()
+        # Read-only engines (scan shards) leave the shared result cache and spatial index to the coordinator
+        self.read_only = read_only
+        self.history = HistoryStore(history_path)
+        self.cache = ResultCache(read_only=read_only)
+        self.geo = GeoIndex(":memory:" if read_only else GEO_INDEX_FILE)
+
+    def load_model(self):
+        # USE resource_path() HERE TO FIND THE BUNDLED FILE
+        model_path = resource_path(MODEL_NAME)
+
+        # Debug print (optional, helps see where it is looking)
+        print(f"Looking for model at: {model_path}", file=sys.stderr)
+
+        # Prefer a parity-checked TFLite/ONNX export; it needs no TensorFlow import at all
+        runtime = select_runtime_model(model_path)
+        if runtime:
+            path, backend = runtime
+            try:
+                self.model = TFLiteModel(path) if backend == "TFLite" else OnnxModel(path)
+                return self._model_loaded(path, backend)
+            except Exception as e:
+                print(f"{backend} runtime unavailable, falling back to Keras: {e}", file=sys.stderr)
+
+        if os.path.exists(model_path):
+            try:
+                import tensorflow as tf
+                self.model = tf.keras.models.load_model(model_path)
+                return self._model_loaded(model_path, "Keras")
+            except Exception as e:
+                return False, str(e)
+        return False, f"Model file not found at: {model_path}"
+
+    def _model_loaded(self, path, backend):
+        # Fingerprint the artifact actually in use, so a quantized export never reuses Keras results
+        self.backend = backend
+        self.model_fingerprint = file_fingerprint(path)
+        if not self.read_only: self.cache.purge_models(self.model_fingerprint)
+        return True, f"Model Loaded Successfully ({backend})"
+
+    def warm_up(self, batch_size=BATCH_SIZE):
+        # The first calls trace the graph for each input shape; pay that here instead of on the first scan
+        if not self.model: return
+        with self.model_lock:
+            self.model.predict_on_batch(np.zeros((batch_size, *MODEL_INPUT_SIZE, 3), dtype=np.uint8))
+            self.model.predict(np.zeros((1, *MODEL_INPUT_SIZE, 3), dtype=np.uint8), verbose=0)
+
+    def load_history(self):
+        # Retention and a possible VACUUM of the scan log; slow on a large history.db, so the GUI runs it on the
+        # model loader thread rather than while the window is being built
+        try:
+            self.history.apply_retention()
+            self.history.compact()
+        except:
+            pass
+
+    def save_history(self):
+        # Commits the scan log, the spatial index and any newly cached results
+        try:
+            started = time.perf_counter()
+            self.history.flush()
+            self.geo.flush()
+            self.cache.flush()
+            self.metrics.observe("flush", time.perf_counter() - started)
+        except:
+            pass
+
+    def preprocess(self, image):
+        return DecodedImage.of(image).model_input()
+
+    def record_scan(self, image_path, confidence, width_px=0, geotag=None, screened=False):
+        # Frames the cascade screened out never got a CNN score, so they are logged as SCREENED, not SAFE
+        result = "SCREENED" if screened else "CRACK" if confidence > 0.5 else "SAFE"
+        self.history.append(os.path.basename(image_path), confidence, result)
+        if geotag: self.geo.add(image_path, geotag, result, confidence, width_px)
+        return result
+
+    @property
+    def result_key(self):
+        # Tiled and whole-frame scores differ for the same image, so each mode caches under its own key
+        if not self.model_fingerprint: return None
+        return self.model_fingerprint + "/tiled" if self.tiled else self.model_fingerprint
+
+    @property
+    def scan_mode(self):
+        # Mission checkpoints key on this: with the cascade on, screened-out frames never reached the CNN, and
+        # with near-duplicate linking on, linked frames carry another frame's verdict
+        key = self.result_key
+        if key and self.cascade is not None: key += f"/cascade{self.cascade:g}"
+        if key and self.near_dup is not None: key += f"/neardup{self.near_dup}"
+        return key
+
+    def screen(self, image):
+        # Cascade stage 1. Returns (to_cnn, audit): frames whose edge span clears self.cascade go on to the CNN,
+        # and so does every CASCADE_AUDIT_EVERY-th reject, flagged as an audit of the pre-filter
+        if VisionProcessor.edge_span(image) >= self.cascade: return True, False
+        audit = self.cascade_stats.sample_reject()
+        return audit, audit
+
+    def lookup_cache(self, image):
+        if not self.model_fingerprint: return None
+        if isinstance(image, DecodedImage):
+            digest = image.digest
+        else:
+            digest = self.cache.known_digest(image)
+        return self.cache.get(digest, self.result_key) if digest else None
+
+    def store_result(self, digest, confidence, width_px, gps, overlay=None, grid=None, geotag=None):
+        if not self.model_fingerprint: return
+        self.cache.put(digest, self.result_key, confidence, width_px, gps,
+                       encode_overlay(overlay) if overlay is not None else None,
+                       encode_grid(grid) if grid is not None else None, geotag)
+
+    def score_tiles(self, pixels, origins, batch_size=BATCH_SIZE):
+        # Native-resolution tiles, batch_size per forward pass; only the last pass is zero-padded
+        scores = np.zeros(len(origins), dtype=np.float32)
+        batch = np.zeros((batch_size, TILE_SIZE, TILE_SIZE, 3), dtype=np.uint8)
+        for start in range(0, len(origins), batch_size):
+            chunk = origins[start:start + batch_size]
+            batch[len(chunk):] = 0
+            for i, (y, x) in enumerate(chunk):
+                batch[i] = pixels[y:y + TILE_SIZE, x:x + TILE_SIZE]
+            with self.model_lock:
+                scores[start:start + len(chunk)] = np.asarray(self.model.predict_on_batch(batch))[:len(chunk), 0]
+        return scores
+
+    def tile_grid(self, pixels, tiles):
+        # Per-tile crack probabilities for select_tiles() output; texture-free tiles are never run and score 0
+        active, origins = tiles
+        grid = np.zeros(active.shape, dtype=np.float32)
+        if len(origins): grid[active] = self.score_tiles(pixels, origins)
+        return grid
+
+    def frame_score(self, image, dilated):
+        # Returns (confidence, tile grid or None). Tiled mode calls the frame cracked if any tile is; frames
+        # smaller than a tile use the whole-frame pass.
+        if self.tiled:
+            tiles = VisionProcessor.select_tiles(dilated)
+            if tiles[0] is not None:
+                grid = self.tile_grid(image.pixels, tiles)
+                return float(grid.max()), grid
+        tensor = np.expand_dims(image.model_input(), axis=0)
+        with self.model_lock:
+            return self.model.predict(tensor, verbose=0)[0][0], None
+
+    def _analyze(self, image, confidence, dilated=None, grid=None):
+        overlay, max_px, _ = VisionProcessor.analyze_xray(image.pixels, dilated, grid, paint=confidence > 0.5)
+        geotag = VisionProcessor.read_geotag(image)
+        gps_data = VisionProcessor.format_geotag(geotag)
+        result = self.record_scan(image.path, confidence, max_px, geotag)
+        self.store_result(image.digest, confidence, max_px, gps_data, overlay, grid, geotag)
+        return result, confidence, VisionProcessor.describe_width(max_px), gps_data, overlay
+
+    def _analyze_cached(self, image, hit):
+        overlay = decode_overlay(hit["overlay"]) if hit["overlay"] is not None else None
+        if overlay is None and isinstance(image, DecodedImage):
+            # Rows cached by a batch run carry no overlay; rebuild it (from the cached tile grid, so no inference)
+            overlay, _, _ = VisionProcessor.analyze_xray(image.pixels, grid=hit["tiles"], paint=hit["confidence"] > 0.5)
+            self.store_result(hit["digest"], hit["confidence"], hit["width_px"], hit["gps"], overlay, hit["tiles"],
+                              hit["geotag"])
+        path = image.path if isinstance(image, DecodedImage) else image
+        result = self.record_scan(path, hit["confidence"], hit["width_px"], hit["geotag"])
+        return result, hit["confidence"], hit["width"], hit["gps"], overlay
+
+    def predict(self, image):
+        # Accepts a path or an already-opened DecodedImage, so callers that show a preview don't decode twice.
+        # Always runs the CNN: the cascade (engine.cascade) only applies to ScanPipeline batch scans.
+        if not self.model: return None, 0.0, 0.0, "", None
+        try:
+            hit = self.lookup_cache(image)
+            if hit is None or hit["overlay"] is None:
+                image = DecodedImage.of(image)
+                self.cache.remember_file(image)
+                hit = hit or self.lookup_cache(image)
+            if hit is not None:
+                analysis = self._analyze_cached(image, hit)
+            else:
+                dilated = VisionProcessor.edge_mask(image.pixels)
+                confidence, grid = self.frame_score(image, dilated)
+                analysis = self._analyze(image, confidence, dilated, grid)
+            self.save_history()
+            return analysis
+        except:
+            return None, 0.0, "Err", "", None
+
+    def predict_batch(self, paths, batch_size=BATCH_SIZE):
+        # Yields (path, result, confidence, width, gps, preview) in input order: a ScanPipeline run, so batches
+        # share forward passes, decode overlaps inference and the cascade/near-duplicate settings apply
+        yield from ScanPipeline(self, batch_size).run(paths)
+
+
+# =============================================================================
+#  SCAN PIPELINE
+# =============================================================================
+class ScanPipeline:
+    # decode/resize (thread pool) -> inference (single stage) -> X-ray width (process pool),
+    # linked by bounded queues so every stage overlaps the others without unbounded read-ahead.
+    # Each image is decoded once; the X-ray stage reads those pixels through a SharedFrame, and
+    # frame_budget caps how many full-resolution frames are alive at once. With engine.near_dup (max hash
+    # distance in bits) set, frames near-identical to an earlier one skip decode, inference and X-ray and take
+    # that representative's result (or are analysed alone if it failed); `links` maps each such path to its
+    # representative. With engine.cascade set, frames the edge pre-filter rejects skip the full decode and the
+    # CNN, and only CNN positives get the X-ray.
+    # Every item carries its per-stage timings, which go to engine.metrics as it is yielded; `last_info` holds
+    # them (and the cascade outcome) for the item just yielded.
+    def __init__(self, engine, batch_size=BATCH_SIZE, decode_workers=DECODE_WORKERS, xray_workers=XRAY_WORKERS,
+                 previews=True, frame_budget=None):
+        self.engine = engine
+        self.previews = previews
+        self._dups = NearDuplicateIndex(engine.near_dup) if engine.near_dup is not None else None
+        self._rep_results = {}
+        self.links = {}
+        self.last_info = None
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.xray_workers = xray_workers
+        self.queue_depth = 2 * batch_size
+        self.frame_budget = frame_budget or batch_size + max(1, xray_workers)
+        self._stop = Event()
+        self._frames = None
+        self._live_frames = set()
+        self._frames_lock = Lock()
+
+    @property
+    def stopped(self):
+        # Set while run() winds down; blocking path sources (FolderWatcher.watch) watch it so the decode stage can exit
+        return self._stop
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _release(self, frame):
+        if frame is None: return
+        with self._frames_lock:
+            if frame not in self._live_frames: return
+            self._live_frames.discard(frame)
+        frame.release()
+        self._frames.release()
+
+    def _link(self, item, image, prev):
+        # Hashes are computed in parallel but matched in input order (each job waits for the one before it),
+        # so a duplicate's representative always comes earlier in the output stream
+        with stage_timer(item["timings"], "hash"):
+            h = perceptual_hash(image)
+        while prev is not None and not prev.wait(0.1):
+            if self._stop.is_set(): raise RuntimeError("Scan stopped")
+        rep = self._dups.match(h, item["path"])
+        if rep is None:
+            item["representative"] = True
+            return False
+        with stage_timer(item["timings"], "exif"):
+            geotag = VisionProcessor.read_geotag(image)
+        item.update(duplicate_of=rep, geotag=geotag, gps=VisionProcessor.format_geotag(geotag))
+        return True
+
+    def _decode(self, path, timings, prev=None, registered=None):
+        # Runs holding the frame-budget slot _decode_stage took for it; the slot goes back unless a frame is kept
+        try:
+            item = self._load(path, timings, prev, registered)
+        except:
+            self._frames.release()
+            raise
+        if "frame" not in item: self._frames.release()
+        return item
+
+    def _load(self, path, timings, prev=None, registered=None):
+        try:
+            item = {"path": path, "timings": timings}
+            with stage_timer(timings, "cache"):
+                item["cached"] = self.engine.lookup_cache(path)
+            if item["cached"] is not None: return item
+            with stage_timer(timings, "read"):
+                image = DecodedImage(path)
+            item.update(size=len(image.data), pixels=image.size[0] * image.size[1])
+            with stage_timer(timings, "cache"):
+                self.engine.cache.remember_file(image)
+                item["cached"] = self.engine.lookup_cache(image)
+            if item["cached"] is not None: return item
+            if self._dups is not None and self._link(item, image, prev): return item
+        finally:
+            if registered is not None: registered.set()
+        if self.engine.cascade is not None:
+            with stage_timer(timings, "prefilter"):
+                to_cnn, audit = self.engine.screen(image)
+            if not to_cnn:
+                with stage_timer(timings, "exif"):
+                    geotag = VisionProcessor.read_geotag(image)
+                with stage_timer(timings, "preview"):
+                    preview = image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE)) if self.previews else None
+                item.update(screened=True, geotag=geotag, gps=VisionProcessor.format_geotag(geotag), preview=preview)
+                return item
+            if audit: item["audit"] = True
+        with stage_timer(timings, "exif"):
+            geotag = VisionProcessor.read_geotag(image)
+        with stage_timer(timings, "decode"):
+            pixels = image.pixels
+        with stage_timer(timings, "preview"):
+            preview = image.preview(PREVIEW_SIZE) if self.previews else None
+        item.update(digest=image.digest, geotag=geotag, gps=VisionProcessor.format_geotag(geotag), preview=preview)
+        tiles = (None, None)
+        if self.engine.tiled:
+            # Tile selection runs here so the inference stage only slices pixels for tiles worth scoring. Its edge
+            # mask also gives the crack width, so tiled frames need no second Canny pass in an X-ray job.
+            with stage_timer(timings, "tiles"):
+                mask = VisionProcessor.edge_mask(pixels)
+                tiles = VisionProcessor.select_tiles(mask)
+            with stage_timer(timings, "xray"):
+                widths = VisionProcessor.crack_widths(mask)
+            item["xray_px"] = int(widths[0]) if len(widths) else 0
+        if tiles[0] is not None:
+            item["tiles"] = tiles
+        else:
+            with stage_timer(timings, "preprocess"):
+                item["tensor"] = image.model_input()
+        with stage_timer(timings, "share"):
+            item["frame"] = SharedFrame(pixels)
+        with self._frames_lock:
+            self._live_frames.add(item["frame"])
+        return item
+
+    def _analyze_alone(self, item):
+        # A linked frame whose representative failed has no verdict to take, so it gets a full analysis here
+        timings = item["timings"]
+        with stage_timer(timings, "read"):
+            image = DecodedImage(item["path"])
+        with stage_timer(timings, "decode"):
+            dilated = VisionProcessor.edge_mask(image.pixels)
+        with stage_timer(timings, "inference"):
+            confidence, grid = self.engine.frame_score(image, dilated)
+        with stage_timer(timings, "xray"):
+            widths = VisionProcessor.crack_widths(dilated)
+        max_px = int(widths[0]) if len(widths) else 0
+        with stage_timer(timings, "preview"):
+            preview = image.preview(PREVIEW_SIZE) if self.previews else None
+        self.engine.store_result(image.digest, confidence, max_px, item["gps"], grid=grid, geotag=item["geotag"])
+        return float(confidence), max_px, preview
+
+    def _decode_stage(self, paths, decode_pool, decode_q):
+        try:
+            prev = None
+            for path in paths:
+                # Frame-budget slots are taken here, in input order, so every job the inference stage waits on
+                # already holds one (taken inside the jobs, a later batch could starve an earlier frame). Time
+                # blocked here means the X-ray stage is behind.
+                timings = {}
+                with stage_timer(timings, "wait"):
+                    while not self._frames.acquire(timeout=0.1):
+                        if self._stop.is_set(): return
+                registered = Event() if self._dups is not None else None
+                job = decode_pool.submit(self._decode, path, timings, prev, registered)
+                if not self._put(decode_q, (path, job)): return
+                prev = registered
+        finally:
+            self._put(decode_q, None)
+
+    def _infer_stage(self, decode_q, xray_pool, result_q):
+        batch = np.zeros((self.batch_size, *MODEL_INPUT_SIZE, 3), dtype=np.uint8)
+        try:
+            done = False
+            while not done:
+                jobs = []
+                while len(jobs) < self.batch_size:
+                    if jobs:
+                        # Don't hold a partial batch back for a slow source (live folder watch)
+                        try:
+                            entry = decode_q.get_nowait()
+                        except queue.Empty:
+                            break
+                    else:
+                        entry = self._get(decode_q)
+                    if entry is None:
+                        done = True
+                        break
+                    jobs.append(entry)
+                if not jobs: break
+                batch[:] = 0
+                items = []
+                loaded = 0
+                for path, job in jobs:
+                    try:
+                        item = job.result()
+                    except:
+                        item = {"path": path, "cached": None}
+                    if "tensor" in item:
+                        batch[loaded] = item.pop("tensor")
+                        item["slot"] = loaded
+                        loaded += 1
+                    items.append(item)
+                scores = None
+                if loaded:
+                    try:
+                        started = time.perf_counter()
+                        with self.engine.model_lock:
+                            scores = np.asarray(self.engine.model.predict_on_batch(batch))[:, 0]
+                        # One forward pass for the batch, shared out evenly
+                        share = (time.perf_counter() - started) / loaded
+                        for item in items:
+                            if "slot" in item: item["timings"]["inference"] = share
+                    except:
+                        pass
+                for item in items:
+                    try:
+                        if "tiles" in item:
+                            with stage_timer(item["timings"], "inference"):
+                                item["grid"] = self.engine.tile_grid(item["frame"].view(), item.pop("tiles"))
+                            item["score"] = float(item["grid"].max())
+                        elif "slot" in item and scores is not None:
+                            item["score"] = scores[item["slot"]]
+                        # With the cascade on, CNN negatives keep their score but skip the full-resolution X-ray
+                        if "score" in item and (self.engine.cascade is None or item["score"] > 0.5):
+                            item["measured"] = True
+                            if "xray_px" not in item:
+                                item["xray_job"] = xray_pool.submit(xray_width_job, item["frame"].name,
+                                                                    item["frame"].shape)
+                    except:
+                        pass
+                    if "xray_job" not in item: self._release(item.get("frame"))
+                    if not self._put(result_q, item): return
+        finally:
+            self._put(result_q, None)
+
+    def run(self, paths):
+        # Yields (path, result, confidence, width, gps, preview) in input order, where preview is a
+        # PREVIEW_SIZE RGB array taken from the single decode (None for cache hits). X-ray overlays
+        # are not shipped back from the process pool.
+        if not self.engine.model:
+            for path in paths: yield path, None, 0.0, 0.0, "", None
+            return
+        self._stop.clear()
+        self._frames = Semaphore(self.frame_budget)
+        decode_q = queue.Queue(self.queue_depth)
+        result_q = queue.Queue(self.queue_depth)
+        decode_pool = ThreadPoolExecutor(self.decode_workers)
+        # xray_workers=0 keeps X-ray in a thread (for shard processes, which already own their share of the cores)
+        if self.xray_workers > 0:
+            xray_pool = ProcessPoolExecutor(self.xray_workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            xray_pool = ThreadPoolExecutor(1)
+        stages = [Thread(target=self._decode_stage, args=(paths, decode_pool, decode_q), daemon=True),
+                  Thread(target=self._infer_stage, args=(decode_q, xray_pool, result_q), daemon=True)]
+        for t in stages: t.start()
+        try:
+            scanned = 0
+            while True:
+                item = self._get(result_q)
+                if item is None: break
+                path = item["path"]
+                timings = item.get("timings", {})
+                analysis = (None, 0.0, "Err", "", None)
+                kind = "error"
+                outcome = None
+                width_px, geotag = 0, None
+                try:
+                    if "xray_job" in item: item["xray_px"], timings["xray"] = item["xray_job"].result()
+                    hit = item["cached"]
+                    # "store": scan log, spatial index and result cache writes
+                    with stage_timer(timings, "store"):
+                        if hit is not None:
+                            width_px, geotag = hit["width_px"], hit["geotag"]
+                            analysis = (self.engine.record_scan(path, hit["confidence"], width_px, geotag),
+                                        hit["confidence"], hit["width"], hit["gps"], None)
+                            kind = "cached"
+                        elif "duplicate_of" in item:
+                            # Linked frame: the representative's verdict, this frame's own position
+                            rep = self._rep_results.get(item["duplicate_of"])
+                            preview = None
+                            if rep is None:
+                                confidence, max_px, preview = self._analyze_alone(item)
+                                screened = False
+                                kind = "scanned"
+                            else:
+                                confidence, max_px, screened = rep
+                                self.links[path] = item["duplicate_of"]
+                                kind = "linked"
+                            width_px, geotag = max_px, item["geotag"]
+                            analysis = (self.engine.record_scan(path, confidence, max_px, geotag, screened), confidence,
+                                        "N/A" if screened else VisionProcessor.describe_width(max_px), item["gps"],
+                                        preview)
+                        else:
+                            # Cascade results stay out of the result cache: it only holds full analyses
+                            screened = bool(item.get("screened"))
+                            if screened:
+                                confidence, max_px, outcome = 0.0, 0, "rejected"
+                            elif item.get("measured"):
+                                confidence, max_px = item["score"], item["xray_px"]
+                                self.engine.store_result(item["digest"], confidence, max_px, item["gps"],
+                                                         grid=item.get("grid"), geotag=item["geotag"])
+                                outcome = "missed" if item.get("audit") else "positive"
+                            else:
+                                confidence, max_px = item["score"], 0
+                                outcome = "audited" if item.get("audit") else "negative"
+                            width_px, geotag = max_px, item["geotag"]
+                            analysis = (self.engine.record_scan(path, confidence, max_px, geotag, screened), confidence,
+                                        "N/A" if screened else VisionProcessor.describe_width(max_px), item["gps"],
+                                        item["preview"])
+                            if item.get("representative"): self._rep_results[path] = (confidence, max_px, screened)
+                            if self.engine.cascade is None: outcome = None
+                            if outcome: self.engine.cascade_stats.count(outcome)
+                            kind = "screened" if screened else "scanned"
+                except:
+                    outcome = None
+                    kind = "error"
+                finally:
+                    self._release(item.get("frame"))
+                self.engine.metrics.record(path, timings, kind, item.get("size"), item.get("pixels"))
+                self.last_info = {"outcome": outcome, "kind": kind, "timings": timings, "size": item.get("size"),
+                                  "pixels": item.get("pixels"), "width_px": width_px, "geotag": geotag}
+                yield (path, *analysis)
+                scanned += 1
+                if scanned % self.batch_size == 0: self.engine.save_history()
+        finally:
+            self._stop.set()
+            for t in stages: t.join()
+            decode_pool.shutdown(cancel_futures=True)
+            xray_pool.shutdown(cancel_futures=True)
+            for frame in list(self._live_frames): self._release(frame)
+            self.engine.save_history()
+
+
+# =============================================================================
+#  SHARDED SCAN
+# =============================================================================
+def shard_worker(tasks, results, threads, batch_size, tiled, previews, near_dup=None, cascade=None):
+    # Entry point of one scan shard (spawned process): its own AI_Engine, pinned to `threads` cores
+    global INFERENCE_THREADS
+    INFERENCE_THREADS = threads
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    import cv2
+    cv2.setNumThreads(threads)
+    # The coordinator owns the scan log, spatial index and result cache: this shard's records go nowhere and
+    # its cache writes travel back with each result
+    engine = AI_Engine(history_path=":memory:", read_only=True)
+    success, msg = engine.load_model()
+    if not success:
+        results.put(("done", -1, msg))
+        return
+    engine.tiled = tiled
+    engine.cascade = cascade
+    engine.near_dup = near_dup
+    # One pipeline for all of this shard's chunks, so its near-duplicate index spans them. X-ray runs in a single
+    # thread here, so the frame budget leaves room for every decode thread instead of one X-ray worker.
+    pipeline = ScanPipeline(engine, batch_size, decode_workers=threads, xray_workers=0, previews=previews,
+                            frame_budget=batch_size + threads)
+    while True:
+        task = tasks.get()
+        if task is None: break
+        start, chunk = task
+        for i, (path, res, conf, width, gps, preview) in enumerate(pipeline.run(chunk)):
+            results.put(("item", start + i, (path, res, float(conf), width, gps, preview, pipeline.links.get(path),
+                                             pipeline.last_info, engine.cache.drain())))
+    results.put(("done", -1, None))
+
+
+class ShardedScan:
+    # Multi-process scan coordinator. Paths (any iterable, consumed lazily) are cut into chunks on a shared
+    # task queue that `shards` processes drain (so fast shards take more chunks), each with its own AI_Engine
+    # and an equal share of the cores. Results come back tagged with their index and are re-ordered here, so
+    # callers get exactly the ScanPipeline.run() stream. Only the coordinator writes the scan log, the spatial
+    # index and the result cache; shards open the cache read-only and send their writes back.
+    def __init__(self, engine, shards=SHARD_WORKERS, batch_size=BATCH_SIZE, previews=True):
+        self.engine = engine
+        self.shards = shards
+        self.batch_size = batch_size
+        self.previews = previews
+        self.links = {}
+        self.threads = max(1, (os.cpu_count() or 2) // shards)
+        self.chunk_size = 4 * batch_size
+
+    @staticmethod
+    def _put(tasks, task, stop, credits=None):
+        # Chunks need a credit, which run() hands back once the caller has consumed a chunk's worth of results, so
+        # a paused or slow consumer stalls the shards instead of piling results up. The task queue is bounded too;
+        # wait for a shard to take a chunk, but give up once the scan is stopped.
+        while credits is not None and not credits.acquire(timeout=0.5):
+            if stop.is_set(): return False
+        while not stop.is_set():
+            try:
+                tasks.put(task, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _feed(self, paths, fed, tasks, stop, fed_all, credits):
+        chunk = []
+        try:
+            for path in paths:
+                if stop.is_set(): return
+                fed.append(path)
+                chunk.append(path)
+                if len(chunk) == self.chunk_size:
+                    if not self._put(tasks, (len(fed) - len(chunk), chunk), stop, credits): return
+                    chunk = []
+            if chunk and not self._put(tasks, (len(fed) - len(chunk), chunk), stop, credits): return
+            # Set before the end markers go out, so every shard that finishes normally finds it set
+            fed_all.set()
+        finally:
+            for _ in range(self.shards): self._put(tasks, None, stop)
+
+    def _record(self, item, info, writes=None):
+        # Scan log, spatial index, result cache and metrics for one result. The shard's own "store" went to
+        # in-memory stores, so the real writes are timed here instead.
+        info = info or {"kind": "error", "timings": {}, "size": None, "pixels": None, "width_px": 0, "geotag": None}
+        timings = dict(info["timings"])
+        timings.pop("store", None)
+        with stage_timer(timings, "store"):
+            self.engine.cache.apply(writes)
+            if item[1]:
+                self.engine.record_scan(item[0], item[2], info["width_px"], info["geotag"], item[1] == "SCREENED")
+        self.engine.metrics.record(item[0], timings, info["kind"], info["size"], info["pixels"])
+
+    def run(self, paths):
+        if not self.engine.model:
+            for path in paths: yield path, None, 0.0, 0.0, "", None
+            return
+        ctx = multiprocessing.get_context("spawn")
+        tasks = ctx.Queue(maxsize=2 * self.shards)
+        results = ctx.Queue()
+        fed = []
+        stop = Event()
+        fed_all = Event()
+        credits = Semaphore(2 * self.shards)
+        feeder = Thread(target=self._feed, args=(paths, fed, tasks, stop, fed_all, credits), daemon=True)
+        workers = [ctx.Process(target=shard_worker, daemon=True,
+                               args=(tasks, results, self.threads, self.batch_size, self.engine.tiled, self.previews,
+                                     self.engine.near_dup, self.engine.cascade))
+                   for _ in range(self.shards)]
+        for w in workers: w.start()
+        feeder.start()
+        pending = {}
+        next_index = 0
+        live = len(workers)
+        failure = None
+        try:
+            while live and not (fed_all.is_set() and next_index >= len(fed)):
+                try:
+                    kind, index, payload = results.get(timeout=0.5)
+                except queue.Empty:
+                    if not any(w.is_alive() for w in workers): break
+                    continue
+                if kind == "done":
+                    live -= 1
+                    if payload:
+                        print(f"Scan shard failed: {payload}", file=sys.stderr)
+                        failure = payload
+                    continue
+                *item, link, info, writes = payload
+                if link: self.links[item[0]] = link
+                # The shards screen; their cascade outcomes are tallied on the coordinator's engine
+                if info["outcome"]: self.engine.cascade_stats.count(info["outcome"])
+                pending[index] = (tuple(item), info, writes)
+                while next_index in pending:
+                    item, info, writes = pending.pop(next_index)
+                    self._record(item, info, writes)
+                    yield item
+                    next_index += 1
+                    if next_index % self.chunk_size == 0: credits.release()
+                    if next_index % self.batch_size == 0: self.engine.save_history()
+            # Anything a crashed shard never returned is reported as an error instead of being dropped
+            while next_index < len(fed):
+                item, info, writes = (pending.pop(next_index, None)
+                                      or ((fed[next_index], None, 0.0, "Err", "", None), None, None))
+                self._record(item, info, writes)
+                yield item
+                next_index += 1
+            # Every shard is gone but the folder isn't finished: fail loudly so the mission stays resumable
+            if not fed_all.is_set():
+                raise RuntimeError(f"All scan shards stopped before the scan finished ({failure or 'shard crashed'})")
+        finally:
+            stop.set()
+            for w in workers:
+                if w.is_alive(): w.terminate()
+            for w in workers: w.join()
+            self.engine.save_history()
@@ -0,0 +1,503 @@
+import sys
+import os
+import json
+import time
+import queue
+import argparse
+import multiprocessing
+import numpy as np
+
+# Headless entry point: only engine.py is imported, never PySide6, so this runs on display-less CPU servers.
+#   python tensorcrete.py scan <folder> --workers N --batch-size B --out results.jsonl --report mission.pdf
+#   python tensorcrete.py scan <folder> --shards S --out results.jsonl   (S engine processes, one per core group)
+#   python tensorcrete.py scan <folder> --resume --out results.jsonl     (continue an interrupted mission)
+#   python tensorcrete.py scan <folder> --include "*/flight_*/*" --exclude "*/rejects/*"
+#   python tensorcrete.py scan <folder> --watch --out live.jsonl          (scan uploads as they land; Ctrl+C ends)
+#   python tensorcrete.py scan <folder> --near-dup 12                     (near-identical frames share one analysis)
+#   python tensorcrete.py scan <folder> --cascade 0.15                    (edge pre-filter before the CNN)
+#   python tensorcrete.py scan <folder> --metrics scan.prom --trace trace.jsonl   (where the time goes)
+#   python tensorcrete.py near --at pier3.jpg --radius 50 --severity Severe   (or --lat/--lon)
+#   python tensorcrete.py export --format tflite --quantize int8 --calibration <folder>
+#   python tensorcrete.py bench --resolutions 2,12,40 --out bench.json --compare baseline.json
+from engine import (APP_NAME, APP_VERSION, BATCH_SIZE, DECODE_WORKERS, XRAY_WORKERS, MODEL_NAME, NEAR_DUP_MAX_DISTANCE,
+                    CASCADE_MIN_SPAN, METRICS_EXPORT_SECONDS, APPDATA_DIR, INFERENCE_THREADS, resource_path,
+                    AI_Engine, ScanPipeline, ShardedScan, MissionLog, ReportGenerator, FolderWatcher,
+                    GeoIndex, ResultCache, DecodedImage, VisionProcessor, discover_images, export_runtime_model)
+
+
+# =============================================================================
+#  SCAN
+# =============================================================================
+def scan_main(args):
+    if not os.path.isdir(args.folder):
+        print(f"Not a folder: {args.folder}", file=sys.stderr)
+        return 2
+    engine = AI_Engine()
+    engine.load_history()
+    success, msg = engine.load_model()
+    if not success:
+        print(f"Could not load model: {msg}", file=sys.stderr)
+        return 1
+    engine.tiled = args.tiled
+    engine.cascade = args.cascade
+    engine.near_dup = args.near_dup
+    if args.trace: engine.metrics.start_trace(args.trace)
+    print(f"{APP_NAME} {APP_VERSION} | {msg} | {args.folder}", file=sys.stderr)
+
+    # Each result is written and flushed as soon as it comes out of the pipeline, so a long survey can be
+    # tailed while it runs and everything scanned so far survives an interruption.
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    report_rows = []
+    counts = {"CRACK": 0, "SAFE": 0, "SCREENED": 0, "ERROR": 0}
+    started = time.time()
+    # --resume checkpoints the mission and replays what an interrupted run already finished
+    mission = MissionLog(args.folder) if args.resume else None
+    done = mission.begin(engine.scan_mode) if mission else {}
+    if done: print(f"Resuming mission: {len(done)} images already scanned", file=sys.stderr)
+    replayed = queue.SimpleQueue()
+    replayed_count = 0
+
+    def source():
+        # The folder walk (or live watch) feeds the scan directly; checkpointed files are handed back for replay instead
+        if args.watch:
+            paths = FolderWatcher(args.folder, args.include, args.exclude).watch(pipeline.stopped)
+        else:
+            paths = discover_images(args.folder, args.include, args.exclude, dedup=not args.no_dedup)
+        for path in paths:
+            if path in done:
+                replayed.put(done[path])
+            else:
+                yield path
+
+    def write(row):
+        out.write(json.dumps(row) + "\n")
+        counts[row["result"] or "ERROR"] += 1
+        if args.report: report_rows.append(row)
+
+    def write_replayed():
+        nonlocal replayed_count
+        while True:
+            try:
+                row = replayed.get_nowait()
+            except queue.Empty:
+                return
+            write({k: row[k] for k in ("filename", "path", "result", "confidence", "width", "gps", "linked_to") if k in row})
+            replayed_count += 1
+
+    finished = False
+    failed = False
+    exported_at = time.monotonic()
+    if args.shards > 1 and not args.watch:
+        pipeline = ShardedScan(engine, args.shards, args.batch_size, previews=False)
+    else:
+        pipeline = ScanPipeline(engine, args.batch_size, args.decode_workers, args.workers, previews=False)
+    try:
+        for path, res, conf, width_str, gps, _ in pipeline.run(source()):
+            write_replayed()
+            row = {"filename": os.path.basename(path), "path": path, "result": res, "confidence": float(conf),
+                   "width": width_str, "gps": gps}
+            if path in pipeline.links: row["linked_to"] = os.path.basename(pipeline.links[path])
+            write(row)
+            out.flush()
+            if mission and res: mission.append(row)
+            # Long and live scans keep the metrics file fresh for a Prometheus textfile collector
+            if args.metrics and time.monotonic() - exported_at > METRICS_EXPORT_SECONDS:
+                engine.metrics.export(args.metrics)
+                exported_at = time.monotonic()
+            if not args.quiet:
+                print(f"[{sum(counts.values())}] {row['filename']} : {res or 'ERROR'}", file=sys.stderr)
+        write_replayed()
+        out.flush()
+        finished = True
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+    except RuntimeError as e:
+        # Every shard died; what was scanned is saved and --resume picks up the rest
+        print(f"Scan failed: {e}", file=sys.stderr)
+        failed = True
+    finally:
+        if out is not sys.stdout: out.close()
+        if mission: mission.close(finished=finished)
+        engine.save_history()
+        engine.metrics.stop_trace()
+        if args.metrics: engine.metrics.export(args.metrics)
+
+    elapsed = time.time() - started
+    scanned = sum(counts.values()) - replayed_count
+    screened = f"{counts['SCREENED']} screened, " if counts["SCREENED"] else ""
+    print(f"Scanned {scanned} images in {elapsed:.1f}s ({scanned / max(elapsed, 1e-9):.1f} img/s): "
+          f"{counts['CRACK']} cracks, {counts['SAFE']} safe, {screened}{counts['ERROR']} errors", file=sys.stderr)
+    if engine.cascade is not None: print(f"Cascade: {engine.cascade_stats.describe()}", file=sys.stderr)
+    if scanned: print(f"Stage time per image: {engine.metrics.describe()}", file=sys.stderr)
+    if args.trace: print(f"Per-image trace saved to {args.trace}", file=sys.stderr)
+    if args.report:
+        ReportGenerator.create_batch_report(args.report, report_rows)
+        print(f"Report saved to {args.report}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+# =============================================================================
+#  SPATIAL QUERY
+# =============================================================================
+def near_main(args):
+    if args.at:
+        geotag = VisionProcessor.read_geotag(args.at)
+        if not geotag:
+            print(f"No GPS position in {args.at}", file=sys.stderr)
+            return 2
+        lat, lon = geotag[0], geotag[1]
+    elif args.lat is not None and args.lon is not None:
+        lat, lon = args.lat, args.lon
+    else:
+        print("Give a centre with --at <image> or --lat/--lon", file=sys.stderr)
+        return 2
+    index = GeoIndex()
+    started = time.perf_counter()
+    hits = index.near(lat, lon, args.radius, args.result, args.severity, args.limit)
+    elapsed = (time.perf_counter() - started) * 1000
+    for hit in hits: print(json.dumps(hit))
+    print(f"{len(hits)} scans within {args.radius:g} m of {lat:.6f}, {lon:.6f} "
+          f"({index.count()} indexed, {elapsed:.1f} ms)", file=sys.stderr)
+    return 0
+
+
+# =============================================================================
+#  MODEL EXPORT
+# =============================================================================
+def export_main(args):
+    calibration = list(discover_images(args.calibration)) if args.calibration else []
+    try:
+        out_path, manifest = export_runtime_model(resource_path(MODEL_NAME), args.format,
+                                                  None if args.quantize == "none" else args.quantize, calibration)
+    except (RuntimeError, ValueError) as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Exported {out_path}")
+    print(f"Parity: max drift {manifest['max_drift']:.4f}, {manifest['flips']} flips on "
+          f"{manifest['samples']} samples -> {'PASSED' if manifest['passed'] else 'FAILED (Keras will be used)'}")
+    return 0 if manifest["passed"] else 1
+
+
+# =============================================================================
+#  BENCHMARK
+# =============================================================================
+BENCH_STAGES = ("decode", "exif", "prefilter", "preprocess", "cnn", "xray", "predict", "pipeline", "report")
+MODEL_STAGES = ("cnn", "predict", "pipeline")
+
+
+def synthetic_frame(path, megapixels, cracked, seed):
+    # Reproducible 4:3 concrete texture (low-frequency shading, grain, pores), optionally with a wandering crack,
+    # saved as a geotagged JPEG like a drone frame. The same arguments always give the same bytes.
+    import cv2
+    from fractions import Fraction
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    w = max(16, int(round((megapixels * 1e6 * 4 / 3) ** 0.5 / 16)) * 16)
+    h = w * 3 // 4
+    img = cv2.resize(rng.normal(0, 1, (h // 8 + 1, w // 8 + 1)).astype(np.float32), (w, h),
+                     interpolation=cv2.INTER_CUBIC) * 10 + 140
+    img += rng.normal(0, 6, (h, w)).astype(np.float32)
+    for _ in range(w * h // 4000):
+        cv2.circle(img, (int(rng.integers(w)), int(rng.integers(h))), int(rng.integers(1, 4)),
+                   float(rng.uniform(90, 120)), -1)
+    if cracked:
+        pts = [(int(rng.integers(w // 10)), int(rng.integers(h)))]
+        for _ in range(30):
+            x, y = pts[-1]
+            pts.append((x + w // 30, int(np.clip(y + rng.integers(-h // 40, h // 40 + 1), 0, h - 1))))
+        cv2.polylines(img, [np.array(pts)], False, 60.0, max(1, int(rng.integers(2, 9)) * w // 1600))
+    gray = np.clip(img, 0, 255).astype(np.uint8)
+    lat, lon = 23.81 + float(rng.uniform(0, 0.001)), 90.41 + float(rng.uniform(0, 0.001))
+    def dms(value):
+        d, m = int(value), int(value * 60) % 60
+        return Fraction(d), Fraction(m), Fraction(value * 3600 % 60).limit_denominator(10000)
+    exif = Image.Exif()
+    exif.get_ifd(0x8825).update({1: "N", 2: dms(lat), 3: "E", 4: dms(lon), 6: Fraction(4550, 100)})
+    Image.fromarray(np.repeat(gray[:, :, None], 3, axis=2)).save(path, quality=90, exif=exif)
+
+
+def bench_images(folder, megapixels, count):
+    # Half clean, half cracked; generated once per (resolution, index) and reused by later runs
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        cracked = i % 2 == 1
+        path = os.path.join(folder, f"{megapixels:g}mp_{'crack' if cracked else 'clean'}_{i:03d}.jpg")
+        if not os.path.exists(path): synthetic_frame(path, megapixels, cracked, seed=int(megapixels * 1000) + i)
+        paths.append(path)
+    return paths
+
+
+def reset_peak_rss():
+    # Linux can reset the high-water mark, so each stage reports its own peak; elsewhere it is the process peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) / 1024
+    except:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                     "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                     "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters),
+                                                 counters.cb)
+        return counters.PeakWorkingSetSize / 2 ** 20
+    except:
+        return None
+
+
+def time_stage(paths, run, setup=None, repeat=3):
+    # setup(path) is untimed (e.g. decoding for the X-ray stage); run(arg) is timed `repeat` times per image after
+    # one warm-up call, so first-call graph tracing and lazy imports stay out of the numbers
+    samples = []
+    reset_peak_rss()
+    for i, path in enumerate(paths):
+        arg = setup(path) if setup else path
+        if i == 0: run(arg)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run(arg)
+            samples.append(time.perf_counter() - started)
+        del arg
+    ms = np.array(samples) * 1000
+    return {"samples": len(samples), "p50_ms": float(np.percentile(ms, 50)), "p90_ms": float(np.percentile(ms, 90)),
+            "p99_ms": float(np.percentile(ms, 99)), "mean_ms": float(ms.mean()),
+            "images_per_sec": 1000 / float(ms.mean()), "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_meta(engine, args):
+    import platform
+    import subprocess
+    import cv2
+    import PIL
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except:
+        commit = None
+    return {"app_version": APP_VERSION, "commit": commit, "backend": engine.backend,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "inference_threads": INFERENCE_THREADS,
+            "numpy": np.__version__, "opencv": cv2.__version__, "pillow": PIL.__version__,
+            "params": {"resolutions": args.resolutions, "images": args.images, "repeat": args.repeat,
+                       "folder_sizes": args.folder_sizes, "report_rows": args.report_rows, "batch_size": args.batch_size}}
+
+
+def headline(result):
+    # The number a stage is compared on, and whether lower is better
+    if "p50_ms" in result: return result["p50_ms"], "ms p50", True
+    if "images_per_sec" in result: return result["images_per_sec"], "img/s", False
+    return result["seconds"], "s", True
+
+
+def print_stage(name, result):
+    value, unit, _ = headline(result)
+    rss = result.get("peak_rss_mb")
+    extra = f", p90 {result['p90_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms" if "p90_ms" in result else ""
+    print(f"  {name:<24} {value:10.2f} {unit}{extra}" + (f", peak RSS {rss:.0f} MB" if rss else ""), file=sys.stderr)
+
+
+def bench_main(args):
+    args.resolutions = [float(v) for v in args.resolutions.split(",") if v]
+    args.folder_sizes = [int(v) for v in args.folder_sizes.split(",") if v]
+    args.report_rows = [int(v) for v in args.report_rows.split(",") if v]
+    stages = args.stages.split(",") if args.stages else list(BENCH_STAGES)
+    unknown = set(stages) - set(BENCH_STAGES)
+    if unknown:
+        print(f"Unknown stages: {', '.join(sorted(unknown))} (choose from {', '.join(BENCH_STAGES)})", file=sys.stderr)
+        return 2
+
+    # Throwaway stores: benchmark frames must not land in the user's scan log, result cache or spatial index, and
+    # with no model fingerprint nothing is served from a cache
+    engine = AI_Engine(history_path=":memory:")
+    engine.cache = ResultCache(":memory:")
+    engine.geo = GeoIndex(":memory:")
+    success, msg = engine.load_model()
+    engine.model_fingerprint = None
+    if not success:
+        print(f"Could not load model ({msg}); skipping {', '.join(MODEL_STAGES)}", file=sys.stderr)
+        stages = [s for s in stages if s not in MODEL_STAGES]
+    engine.warm_up(args.batch_size)
+    print(f"{APP_NAME} {APP_VERSION} benchmark | {msg if success else 'no model'}", file=sys.stderr)
+
+    def decoded(path):
+        image = DecodedImage(path)
+        image.pixels
+        return image
+
+    # stage: (untimed setup, timed call)
+    timed = {
+        "decode": (None, lambda path: DecodedImage(path).pixels),
+        "exif": (None, VisionProcessor.get_exif_gps),
+        "prefilter": (None, lambda path: VisionProcessor.edge_span(DecodedImage(path))),
+        "preprocess": (decoded, lambda image: image.model_input()),
+        "cnn": (lambda path: np.expand_dims(DecodedImage(path).model_input(), axis=0),
+                lambda batch: engine.model.predict(batch, verbose=0)),
+        "xray": (decoded, VisionProcessor.process_xray),
+        "predict": (None, engine.predict),
+    }
+    results = {"meta": bench_meta(engine, args), "stages": {}}
+    for mp in args.resolutions:
+        print(f"{mp:g} MP", file=sys.stderr)
+        paths = bench_images(os.path.join(args.data, f"{mp:g}mp"), mp, max(args.images, 1))
+        for stage in stages:
+            if stage in timed:
+                setup, run = timed[stage]
+                result = time_stage(paths, run, setup, args.repeat)
+            elif stage == "pipeline":
+                for size in args.folder_sizes:
+                    folder = [paths[i % len(paths)] for i in range(size)]
+                    reset_peak_rss()
+                    started = time.perf_counter()
+                    for _ in ScanPipeline(engine, args.batch_size, previews=False).run(folder): pass
+                    elapsed = time.perf_counter() - started
+                    result = {"images": size, "seconds": elapsed, "images_per_sec": size / elapsed,
+                              "peak_rss_mb": peak_rss_mb()}
+                    results["stages"][f"pipeline@{mp:g}mp/{size}"] = result
+                    print_stage(f"pipeline x{size}", result)
+                continue
+            else:
+                continue
+            results["stages"][f"{stage}@{mp:g}mp"] = result
+            print_stage(stage, result)
+
+    if "report" in stages and args.report_rows:
+        print("Report", file=sys.stderr)
+        paths = bench_images(os.path.join(args.data, f"{args.resolutions[0]:g}mp"), args.resolutions[0],
+                             max(args.images, 1))
+        pdf = os.path.join(args.data, "bench_report.pdf")
+        for rows in args.report_rows:
+            # One CRACK in ten, so the defect thumbnail pages are exercised as in a real mission
+            data = [{"filename": f"frame_{i:05d}.jpg", "path": paths[i % len(paths)],
+                     "result": "CRACK" if i % 10 == 0 else "SAFE", "confidence": 0.9 if i % 10 == 0 else 0.1,
+                     "width": "42px (Moderate)" if i % 10 == 0 else "0px (Micro)", "gps": "23.81000° N, 90.41000° E"}
+                    for i in range(rows)]
+            reset_peak_rss()
+            started = time.perf_counter()
+            pages = 0
+            for _, pages in ReportGenerator.iter_batch_report(pdf, data): pass
+            elapsed = time.perf_counter() - started
+            result = {"rows": rows, "pages": pages, "seconds": elapsed, "pdf_kb": os.path.getsize(pdf) // 1024,
+                      "peak_rss_mb": peak_rss_mb()}
+            results["stages"][f"report/{rows}"] = result
+            print_stage(f"report x{rows}", result)
+        os.remove(pdf)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        meta = baseline.get("meta", {})
+        print(f"Against {args.compare} ({meta.get('commit') or '?'}, {meta.get('backend') or 'no model'}):",
+              file=sys.stderr)
+        for name, result in results["stages"].items():
+            if name not in baseline.get("stages", {}): continue
+            value, unit, lower_is_better = headline(result)
+            old = headline(baseline["stages"][name])[0]
+            if not old: continue
+            change = (value - old) / old
+            better = change < 0 if lower_is_better else change > 0
+            print(f"  {name:<24} {old:10.2f} -> {value:10.2f} {unit}  {change:+.1%}"
+                  f"{' (better)' if better and abs(change) >= 0.05 else ' (worse)' if abs(change) >= 0.05 else ''}",
+                  file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tensorcrete", description=f"{APP_NAME} headless tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="scan a folder of images and stream results as JSON lines")
+    scan.add_argument("folder")
+    scan.add_argument("--workers", type=int, default=XRAY_WORKERS, help="X-ray worker processes")
+    scan.add_argument("--decode-workers", type=int, default=DECODE_WORKERS, help="image decode threads")
+    scan.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    scan.add_argument("--shards", type=int, default=1,
+                      help="engine processes, each with its own model and cpu_count/N threads (replaces --workers)")
+    scan.add_argument("--out", help="results file (JSON lines); stdout if omitted")
+    scan.add_argument("--report", help="also write a mission PDF report")
+    scan.add_argument("--tiled", action="store_true", help="tiled full-resolution inference")
+    scan.add_argument("--include", action="append", default=[], metavar="GLOB",
+                      help="only scan images matching this glob (relative path or file name); repeatable")
+    scan.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                      help="skip files and folders matching this glob; repeatable")
+    scan.add_argument("--no-dedup", action="store_true", help="scan byte-identical copies too")
+    scan.add_argument("--near-dup", type=int, nargs="?", const=NEAR_DUP_MAX_DISTANCE, metavar="BITS",
+                      help=f"give near-identical frames (perceptual hash within BITS of 256, default "
+                           f"{NEAR_DUP_MAX_DISTANCE}) the result of the first one instead of analysing each")
+    scan.add_argument("--cascade", type=float, nargs="?", const=CASCADE_MIN_SPAN, metavar="SPAN",
+                      help=f"only send frames whose longest edge structure spans at least SPAN of the frame "
+                           f"(default {CASCADE_MIN_SPAN:g}) to the CNN, and only CNN positives to the X-ray")
+    scan.add_argument("--watch", action="store_true",
+                      help="keep scanning new images as they are uploaded until Ctrl+C (runs in-process, ignores --shards)")
+    scan.add_argument("--resume", action="store_true",
+                      help="checkpoint the mission and skip images an interrupted run already scanned")
+    scan.add_argument("--metrics", metavar="FILE",
+                      help="write per-stage timing histograms and counters (Prometheus text, or JSON for *.json); "
+                           f"refreshed every {METRICS_EXPORT_SECONDS:g}s while scanning")
+    scan.add_argument("--trace", metavar="FILE", help="write every image's stage timings as JSON lines")
+    scan.add_argument("--quiet", action="store_true", help="no per-image progress on stderr")
+    scan.set_defaults(func=scan_main)
+
+    near = commands.add_parser("near", help="list geotagged scans around a point, nearest first")
+    near.add_argument("--at", metavar="IMAGE", help="use this image's GPS position as the centre")
+    near.add_argument("--lat", type=float)
+    near.add_argument("--lon", type=float)
+    near.add_argument("--radius", type=float, default=50.0, help="metres (default 50)")
+    near.add_argument("--result", choices=("CRACK", "SAFE", "SCREENED"))
+    near.add_argument("--severity", choices=("Micro", "Hairline", "Moderate", "Severe"))
+    near.add_argument("--limit", type=int)
+    near.set_defaults(func=near_main)
+
+    export = commands.add_parser("export", help="export the Keras model to an optimized CPU runtime")
+    export.add_argument("--format", choices=("tflite", "onnx"), default="tflite")
+    export.add_argument("--quantize", choices=("none", "dynamic", "int8"), default="none")
+    export.add_argument("--calibration", help="folder of sample images for int8 calibration and the parity check")
+    export.set_defaults(func=export_main)
+
+    bench = commands.add_parser("bench", help="benchmark the inference and vision hot paths on synthetic imagery")
+    bench.add_argument("--resolutions", default="2,12,40", metavar="MP,...", help="frame sizes in megapixels")
+    bench.add_argument("--images", type=int, default=6, help="frames per resolution, half of them cracked")
+    bench.add_argument("--repeat", type=int, default=3, help="timed runs per frame and stage")
+    bench.add_argument("--folder-sizes", default="16,64", metavar="N,...",
+                       help="images per end-to-end pipeline run (frames are reused to fill the folder)")
+    bench.add_argument("--report-rows", default="100,1000", metavar="N,...", help="rows per PDF report build")
+    bench.add_argument("--stages", metavar="STAGE,...", help=f"subset of {','.join(BENCH_STAGES)}")
+    bench.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    bench.add_argument("--data", default=os.path.join(APPDATA_DIR, "bench"),
+                       help="where the synthetic frames are generated (and reused by later runs)")
+    bench.add_argument("--out", default="bench.json", help="results file (JSON)")
+    bench.add_argument("--compare", metavar="BASELINE", help="an earlier results file to print changes against")
+    bench.set_defaults(func=bench_main)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
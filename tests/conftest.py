@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# engine.py creates its AppData folder on import; keep the tests out of the real one
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="tensorcrete-tests-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+import pytest
+
+from engine import GeoIndex
+
+PIER = (23.7000, 90.4000)
+
+
+def offset(north_m, east_m=0.0):
+    # Good to a few cm over the few hundred metres used here
+    lat = PIER[0] + north_m / 111195.0
+    return lat, PIER[1] + east_m / (111195.0 * 0.9157), 10.0
+
+
+@pytest.fixture(params=[True, False], ids=["rtree", "lat-band"])
+def index(request, tmp_path):
+    geo = GeoIndex(str(tmp_path / "geo.db"))
+    if not request.param: geo.rtree = False
+    geo.add("crack_20m.jpg", offset(20), "CRACK", 0.9, 120)
+    geo.add("crack_40m.jpg", offset(0, 40), "CRACK", 0.8, 20)
+    geo.add("safe_10m.jpg", offset(-10), "SAFE", 0.1, 150)
+    geo.add("screened_5m.jpg", offset(5), "SCREENED", 0.0, 0)
+    geo.add("crack_300m.jpg", offset(300), "CRACK", 0.95, 200)
+    return geo
+
+
+def test_radius_and_order(index):
+    hits = index.near(*PIER, 50)
+    assert [h["path"] for h in hits] == ["safe_10m.jpg", "crack_20m.jpg", "crack_40m.jpg"]
+    assert hits[1]["distance_m"] == pytest.approx(20, abs=0.5)
+    assert index.near(*PIER, 50, limit=1)[0]["path"] == "safe_10m.jpg"
+
+
+def test_result_filter(index):
+    assert [h["path"] for h in index.near(*PIER, 500, result="CRACK")] == \
+        ["crack_20m.jpg", "crack_40m.jpg", "crack_300m.jpg"]
+    assert [h["path"] for h in index.near(*PIER, 50, result="SCREENED")] == ["screened_5m.jpg"]
+
+
+def test_severity_only_grades_cracks(index):
+    assert [h["path"] for h in index.near(*PIER, 50, severity="Severe")] == ["crack_20m.jpg"]
+    safe = index.near(*PIER, 50, result="SAFE")[0]
+    assert safe["severity"] == ""
+
+
+def test_rescan_moves_point(index):
+    index.add("crack_300m.jpg", offset(30), "SAFE", 0.2, 0)
+    assert index.count() == 5
+    hits = index.near(*PIER, 50)
+    assert [h["path"] for h in hits] == ["safe_10m.jpg", "crack_20m.jpg", "crack_300m.jpg", "crack_40m.jpg"]
+    assert index.near(*PIER, 500, result="CRACK")[-1]["path"] == "crack_40m.jpg"
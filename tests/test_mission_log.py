@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from engine import MissionLog
+
+
+@pytest.fixture
+def survey(tmp_path):
+    folder = tmp_path / "survey"
+    folder.mkdir()
+    paths = []
+    for i in range(3):
+        path = folder / f"img{i}.jpg"
+        path.write_bytes(b"x" * (i + 1))
+        paths.append(str(path))
+    return folder, paths
+
+
+def run(folder, root, mode, paths, finished=False):
+    log = MissionLog(str(folder), root=str(root))
+    done = log.begin(mode)
+    for path in paths:
+        if path not in done: log.append({"path": path, "result": "SAFE"})
+    log.close(finished=finished)
+    return done
+
+
+def test_resume_keeps_unchanged_results(survey, tmp_path):
+    folder, paths = survey
+    root = tmp_path / "missions"
+    assert run(folder, root, "model", paths[:2]) == {}
+    done = MissionLog(str(folder), root=str(root)).begin("model")
+    assert sorted(done) == paths[:2]
+    assert done[paths[0]]["result"] == "SAFE"
+
+
+def test_finished_mission_starts_over(survey, tmp_path):
+    folder, paths = survey
+    root = tmp_path / "missions"
+    run(folder, root, "model", paths, finished=True)
+    assert MissionLog(str(folder), root=str(root)).begin("model") == {}
+
+
+def test_torn_line_is_skipped_and_dropped(survey, tmp_path):
+    folder, paths = survey
+    root = tmp_path / "missions"
+    run(folder, root, "model", paths[:2])
+    log = MissionLog(str(folder), root=str(root))
+    with open(log.results_path, "a", encoding="utf-8") as f:
+        f.write('{"path": "' + paths[2].replace("\\", "\\\\") + '", "res')
+    done = log.begin("model")
+    log.close()
+    assert sorted(done) == paths[:2]
+    with open(log.results_path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert sorted(row["path"] for row in rows) == paths[:2]
+
+
+def test_mode_mismatch_discards_results(survey, tmp_path):
+    folder, paths = survey
+    root = tmp_path / "missions"
+    run(folder, root, "model/tiled", paths)
+    log = MissionLog(str(folder), root=str(root))
+    assert log.completed("model") == {}
+    assert log.begin("model") == {}
+    log.close()
+    assert log.read_manifest()["mode"] == "model"
+    assert os.path.getsize(log.results_path) == 0
+
+
+def test_changed_file_is_scanned_again(survey, tmp_path):
+    folder, paths = survey
+    root = tmp_path / "missions"
+    run(folder, root, "model", paths)
+    st = os.stat(paths[1])
+    os.utime(paths[1], (st.st_atime, st.st_mtime + 10))
+    os.remove(paths[2])
+    done = MissionLog(str(folder), root=str(root)).completed("model")
+    assert sorted(done) == paths[:1]
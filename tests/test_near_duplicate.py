@@ -0,0 +1,57 @@
+import numpy as np
+from PIL import Image
+
+from engine import NEAR_DUP_HASH_SIZE, NearDuplicateIndex, perceptual_hash
+
+BITS = NEAR_DUP_HASH_SIZE ** 2
+
+
+def flip(h, *bits):
+    for bit in bits: h ^= 1 << bit
+    return h
+
+
+def test_first_frame_becomes_representative():
+    index = NearDuplicateIndex(max_distance=4)
+    assert index.match(0b1011, "a") is None
+    assert index.keys == ["a"]
+
+
+def test_match_within_distance():
+    index = NearDuplicateIndex(max_distance=4)
+    base = (1 << BITS) - 1 >> 3
+    index.match(base, "a")
+    # Spread over several chunks, so no single chunk bucket is relied on
+    assert index.match(flip(base, 0, 70, 140, BITS - 1), "b") == "a"
+    assert index.keys == ["a"]
+
+
+def test_too_far_registers_new_representative():
+    index = NearDuplicateIndex(max_distance=4)
+    index.match(0, "a")
+    assert index.match(flip(0, *range(0, 50, 10)), "b") is None
+    assert index.keys == ["a", "b"]
+
+
+def test_nearest_representative_wins():
+    index = NearDuplicateIndex(max_distance=4)
+    index.match(0, "a")
+    index.match(flip(0, 1, 2, 3, 4, 5, 6), "b")
+    assert index.match(flip(0, 1, 2, 3, 4, 5), "c") == "b"
+    assert index.match(flip(0, 100), "d") == "a"
+
+
+def test_noisy_copy_hashes_close(tmp_path):
+    rng = np.random.default_rng(0)
+    # Coarse blotches the hash can see, under grain it should ignore
+    coarse = Image.fromarray(rng.integers(60, 200, (12, 16, 3), dtype=np.uint8)).resize((256, 192), Image.Resampling.BICUBIC)
+    frame = np.clip(np.asarray(coarse, np.float32) + rng.normal(0, 8, (192, 256, 3)), 0, 255).astype(np.uint8)
+    noisy = np.clip(frame + rng.normal(0, 3, frame.shape), 0, 255).astype(np.uint8)
+    paths = {}
+    for name, pixels in (("frame", frame), ("noisy", noisy), ("mirrored", frame[:, ::-1])):
+        paths[name] = str(tmp_path / f"{name}.png")
+        Image.fromarray(pixels).save(paths[name])
+    index = NearDuplicateIndex()
+    index.match(perceptual_hash(paths["frame"]), "frame")
+    assert index.match(perceptual_hash(paths["noisy"]), "noisy") == "frame"
+    assert index.match(perceptual_hash(paths["mirrored"]), "mirrored") is None